@@ -4,13 +4,14 @@
 from OpenGL.GL import *
 import OpenGL.GL.shaders
 from libs.gpu_shape import GPUShape
+from libs.uniforms import UniformCacheMixin
 
 import sys
 import os.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from libs.assets_path import getAssetPath
 
-class SimpleFlatShaderProgram():
+class SimpleFlatShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -92,6 +93,7 @@ class SimpleFlatShaderProgram():
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -102,15 +104,15 @@ class SimpleFlatShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
@@ -129,7 +131,7 @@ class SimpleFlatShaderProgram():
         glBindVertexArray(0)
 
 
-class SimpleTextureFlatShaderProgram():
+class SimpleTextureFlatShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -218,6 +220,7 @@ class SimpleTextureFlatShaderProgram():
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -228,15 +231,15 @@ class SimpleTextureFlatShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
 
@@ -257,7 +260,7 @@ class SimpleTextureFlatShaderProgram():
         glBindVertexArray(0)
 
 
-class SimpleGouraudShaderProgram():
+class SimpleGouraudShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -339,6 +342,7 @@ class SimpleGouraudShaderProgram():
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -349,15 +353,15 @@ class SimpleGouraudShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
@@ -376,7 +380,7 @@ class SimpleGouraudShaderProgram():
         glBindVertexArray(0)
 
 
-class SimpleTextureGouraudShaderProgram():
+class SimpleTextureGouraudShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -465,6 +469,7 @@ class SimpleTextureGouraudShaderProgram():
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -475,15 +480,15 @@ class SimpleTextureGouraudShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
 
@@ -504,7 +509,7 @@ class SimpleTextureGouraudShaderProgram():
         glBindVertexArray(0)
 
 
-class SimplePhongShaderProgram:
+class SimplePhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         vertex_shader = """
@@ -592,6 +597,7 @@ class SimplePhongShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -602,15 +608,15 @@ class SimplePhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
@@ -629,7 +635,7 @@ class SimplePhongShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTexturePhongShaderProgram:
+class SimpleTexturePhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         vertex_shader = """
@@ -721,6 +727,7 @@ class SimpleTexturePhongShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape, obj):
@@ -731,17 +738,17 @@ class SimpleTexturePhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         if obj=="obj": glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         else: glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         if obj=="obj": glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         else: glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         if obj=="obj": glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         else: glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
@@ -763,7 +770,7 @@ class SimpleTexturePhongShaderProgram:
         glBindVertexArray(0)
 
 #TAREA4: Se crea este nuevo shader para usar múltiples luces con texturas
-class MultipleLightTexturePhongShaderProgram:
+class MultipleLightTexturePhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         #TAREA4: Ahora los shaders están en archivos de texto independientes, se leen aquí
@@ -781,6 +788,7 @@ class MultipleLightTexturePhongShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -791,15 +799,15 @@ class MultipleLightTexturePhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
 
@@ -820,7 +828,7 @@ class MultipleLightTexturePhongShaderProgram:
         glBindVertexArray(0)
 
 #TAREA4: Se crea este shader para soportar geometría con color y múltiples luces
-class MultipleLightPhongShaderProgram:
+class MultipleLightPhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         #TAREA4: Ahora los shaders están en archivos de texto independientes, aquí los leemos
@@ -838,6 +846,7 @@ class MultipleLightPhongShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -848,15 +857,15 @@ class MultipleLightPhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
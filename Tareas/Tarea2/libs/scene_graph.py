@@ -95,7 +95,7 @@ def drawSceneGraphNode(node, pipeline, transformName, parentTransform=tr.identit
     # Hence, it can be drawn with drawCall
     if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape):
         leaf = node.childs[0]
-        glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, transformName), 1, GL_TRUE, newTransform)
+        pipeline.set_mat4(transformName, newTransform)
         pipeline.drawCall(leaf)
 
     # If the child node is not a leaf, it MUST be a SceneGraphNode,
@@ -4,6 +4,7 @@ import numpy as np
 from PIL import Image
 
 from libs.gpu_shape import GPUShape
+from libs.uniforms import UniformCacheMixin
 
 SIZE_IN_BYTES = 4
 
@@ -40,7 +41,7 @@ def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMo
     return texture
 
 
-class SimpleModelViewProjectionShaderProgram:
+class SimpleModelViewProjectionShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -82,6 +83,7 @@ class SimpleModelViewProjectionShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -92,15 +94,15 @@ class SimpleModelViewProjectionShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         if normal >= 0:
             glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
             glEnableVertexAttribArray(normal)
@@ -121,7 +123,7 @@ class SimpleModelViewProjectionShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTextureModelViewProjectionShaderProgram:
+class SimpleTextureModelViewProjectionShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -165,6 +167,7 @@ class SimpleTextureModelViewProjectionShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape, obj):
@@ -175,17 +178,17 @@ class SimpleTextureModelViewProjectionShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         if obj=="obj": glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         else: glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         if obj=="obj": glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         else: glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         if normal >= 0:
             if obj=="obj": glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
             else: glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(20))
@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Cached uniform and attribute locations with typed, redundancy-aware setters"""
+
+from OpenGL.GL import *
+import numpy as np
+
+
+class ProgramUniforms:
+    """
+    Locations and last uploaded values of one linked program.
+    Pipelines compiled from the same sources share the GL program, so they
+    also share this object (see getProgramUniforms) and never disagree
+    about what is already uploaded.
+    """
+    def __init__(self, program):
+        self.program = program
+        self.uniforms = {}
+        self.attributes = {}
+        self.values = {}
+        self.masks = {} # comparison buffers of the array values
+        self.uploads = 0 # glUniform* calls issued
+        self.skipped = 0 # glUniform* calls saved because the value did not change
+        self.lookupsSaved = 0 # glGet*Location calls saved by the cache
+
+        # Resolving every active uniform once, right after linking
+        for index in range(glGetProgramiv(program, GL_ACTIVE_UNIFORMS)):
+            name, _, _ = glGetActiveUniform(program, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            name = name.split("[")[0]
+            self.uniforms[name] = glGetUniformLocation(program, name)
+
+    def uniformLocation(self, name):
+        if name in self.uniforms:
+            self.lookupsSaved += 1
+        else:
+            self.uniforms[name] = glGetUniformLocation(self.program, name)
+        return self.uniforms[name]
+
+    def attribLocation(self, name):
+        if name in self.attributes:
+            self.lookupsSaved += 1
+        else:
+            self.attributes[name] = glGetAttribLocation(self.program, name)
+        return self.attributes[name]
+
+    def changed(self, name, value):
+        """True if value differs from the last upload, and remembers it.
+        Arrays are compared with and copied into a buffer kept per name,
+        numbers and tuples are kept as they are, so no array is created."""
+        stored = self.values.get(name)
+        if isinstance(value, np.ndarray):
+            if isinstance(stored, np.ndarray) and stored.shape == value.shape:
+                if not np.not_equal(stored, value, out=self.masks[name]).any():
+                    self.skipped += 1
+                    return False
+                np.copyto(stored, value)
+            else:
+                self.values[name] = np.array(value, copy=True)
+                self.masks[name] = np.empty(value.shape, dtype=bool)
+        elif stored is not None and not isinstance(stored, np.ndarray) and stored == value:
+            self.skipped += 1
+            return False
+        else:
+            self.values[name] = value
+        self.uploads += 1
+        return True
+
+    def invalidate(self):
+        """Forgets the uploaded values, for instance after raw glUniform calls"""
+        self.values = {}
+
+    def stats(self):
+        return {"uploads": self.uploads, "skipped": self.skipped, "lookupsSaved": self.lookupsSaved}
+
+
+_programs = {}
+
+
+def getProgramUniforms(program):
+    key = int(program)
+    if key not in _programs:
+        _programs[key] = ProgramUniforms(program)
+    return _programs[key]
+
+
+class UniformCacheMixin:
+    """
+    Typed uniform setters for the pipeline classes. They need the program
+    to be in use (glUseProgram) and skip the upload when the value is the
+    same as the last one set through them.
+    """
+    def cacheLocations(self):
+        self.uniforms = getProgramUniforms(self.shaderProgram)
+
+    def attribLocation(self, name):
+        return self.uniforms.attribLocation(name)
+
+    def uniformLocation(self, name):
+        return self.uniforms.uniformLocation(name)
+
+    def set_float(self, name, x):
+        if self.uniforms.changed(name, x):
+            glUniform1f(self.uniforms.uniformLocation(name), x)
+
+    def set_int(self, name, x):
+        if self.uniforms.changed(name, x):
+            glUniform1i(self.uniforms.uniformLocation(name), x)
+
+    def set_uint(self, name, x):
+        if self.uniforms.changed(name, x):
+            glUniform1ui(self.uniforms.uniformLocation(name), x)
+
+    def set_vec3(self, name, x, y, z):
+        if self.uniforms.changed(name, (x, y, z)):
+            glUniform3f(self.uniforms.uniformLocation(name), x, y, z)
+
+    def set_vec4(self, name, x, y, z, w):
+        if self.uniforms.changed(name, (x, y, z, w)):
+            glUniform4f(self.uniforms.uniformLocation(name), x, y, z, w)
+
+    def set_mat4(self, name, matrix):
+        # Matrices in transformations are row major, hence GL_TRUE
+        if self.uniforms.changed(name, matrix):
+            glUniformMatrix4fv(self.uniforms.uniformLocation(name), 1, GL_TRUE, matrix)
@@ -2,6 +2,8 @@
 import sys
 import os
 import pyglet
+import libs.headless as hl
+HEADLESS = hl.parseOptions(sys.argv[1:]) # None when drawing to a window, before pyglet.gl is loaded
 import numpy as np
 import libs.shaders as sh
 import libs.transformations as tr
@@ -34,11 +36,15 @@ ASSETS = {
     "icon": getAssetPath("icon.png"), # icon by Freepik
 }
 
-# Aspect ratio and projection
-display = pyglet.canvas.Display()
-screen = display.get_default_screen()
-screen_height = screen.height
-screen_width = screen.width
+# Aspect ratio and projection, of the screen or of the offscreen target
+if HEADLESS is None:
+    display = pyglet.canvas.Display()
+    screen = display.get_default_screen()
+    screen_height = screen.height
+    screen_width = screen.width
+else:
+    screen_height = HEADLESS.height
+    screen_width = HEADLESS.width
 ORTHO = tr.ortho(-10*screen_width/screen_height, 10*screen_width/screen_height, -10, 10, 0.1, 100)
 TEX = [GL_REPEAT, GL_REPEAT, GL_NEAREST, GL_NEAREST]
 
@@ -46,9 +52,12 @@ TEX = [GL_REPEAT, GL_REPEAT, GL_NEAREST, GL_NEAREST]
 class Controller(pyglet.window.Window):
     def __init__(self, width, height, title=f"La mejor tarea 2 de la sección"):
         # Initial setup of the window
-        super().__init__(width, height, title, fullscreen=True)
-        self.set_exclusive_mouse(True)
-        self.set_icon(pyglet.image.load(ASSETS["icon"]))
+        if HEADLESS is None:
+            super().__init__(width, height, title, fullscreen=True)
+            self.set_exclusive_mouse(True)
+            self.set_icon(pyglet.image.load(ASSETS["icon"]))
+        else: # hidden, frames go to the framebuffer object of hl.run
+            super().__init__(width, height, title, visible=False)
 
         # Time in the scene
         self.total_time = 0.0
@@ -289,24 +298,24 @@ def on_draw():
     scene.amongUsShadow.transform = tr.matmul([tr.translate(9, -1, 0.1), tr.scale(2, 2, 0.01), tr.rotationZ(np.pi), tr.rotationX(np.pi/2)])
 
     # Lighting shader
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "La"), 0.8, 0.8, 0.8)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "Ld"), 0.9, 0.9, 0.9)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "Ls"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "Ka"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "Kd"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "Ks"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "lightPosition"), 0, 0, 25)
-    glUniform3f(glGetUniformLocation(scene.pipeline.shaderProgram, "viewPosition"), camera.eye[0], camera.eye[1], camera.eye[2])
-    glUniform1ui(glGetUniformLocation(scene.pipeline.shaderProgram, "shininess"), 300)
-    glUniform1f(glGetUniformLocation(scene.pipeline.shaderProgram, "constantAttenuation"), 0.1)
-    glUniform1f(glGetUniformLocation(scene.pipeline.shaderProgram, "linearAttenuation"), 0.1)
-    glUniform1f(glGetUniformLocation(scene.pipeline.shaderProgram, "quadraticAttenuation"), 0.01)
+    scene.pipeline.set_vec3("La", 0.8, 0.8, 0.8)
+    scene.pipeline.set_vec3("Ld", 0.9, 0.9, 0.9)
+    scene.pipeline.set_vec3("Ls", 1, 1, 1)
+    scene.pipeline.set_vec3("Ka", 1, 1, 1)
+    scene.pipeline.set_vec3("Kd", 1, 1, 1)
+    scene.pipeline.set_vec3("Ks", 1, 1, 1)
+    scene.pipeline.set_vec3("lightPosition", 0, 0, 25)
+    scene.pipeline.set_vec3("viewPosition", camera.eye[0], camera.eye[1], camera.eye[2])
+    scene.pipeline.set_uint("shininess", 300)
+    scene.pipeline.set_float("constantAttenuation", 0.1)
+    scene.pipeline.set_float("linearAttenuation", 0.1)
+    scene.pipeline.set_float("quadraticAttenuation", 0.01)
 
     # Camera tracking of the ship, projection and view
     camera.update(movement.eye)
     view = tr.lookAt(camera.eye, camera.at, camera.up)
-    glUniformMatrix4fv(glGetUniformLocation(scene.pipeline.shaderProgram, "projection"), 1, GL_TRUE, camera.projection)
-    glUniformMatrix4fv(glGetUniformLocation(scene.pipeline.shaderProgram, "view"), 1, GL_TRUE, view)
+    scene.pipeline.set_mat4("projection", camera.projection)
+    scene.pipeline.set_mat4("view", view)
     sg.drawSceneGraphNode(scene.root, scene.pipeline, "model")
 
 # Set a time in controller
@@ -315,5 +324,8 @@ def update(dt, controller):
 
 # Start the scene
 if __name__ == '__main__':
-    pyglet.clock.schedule(update, controller)
-    pyglet.app.run()
\ No newline at end of file
+    if HEADLESS is not None: # a fixed number of frames with a fixed dt and scripted input
+        hl.run(controller, HEADLESS, lambda dt: update(dt, controller))
+    else:
+        pyglet.clock.schedule(update, controller)
+        pyglet.app.run()
\ No newline at end of file
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""NumPy arrays created by the steady state frames of tarea3, drawn offscreen.
+Every frame (simulation ticks and on_draw) of a few flights is traced with
+bench_inplace.peakArrays; after warming up, none of them may leave a single
+temporary alive between two bytecodes.
+    python benchmarks/bench_allocations.py [--size 1280x720]"""
+
+import sys, os
+import numpy as np
+import pyglet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "--headless" not in sys.argv:
+    sys.argv.append("--headless") # tarea3 reads its options when imported
+import libs.headless as hl
+import tarea3 as t3
+from bench_inplace import peakArrays
+
+WARMUP = 30 # frames before tracing, the first ones create the buffers that are reused later
+TRACED = 3
+
+# Events of each flight, by frame, then its steady state is traced
+FLIGHTS = {
+    "free flight, orthographic": [
+        {"frame": 0, "event": "on_key_press", "key": "W"},
+        {"frame": 0, "event": "on_key_press", "key": "A"},
+    ],
+    "free flight, perspective": [
+        {"frame": 0, "event": "on_key_press", "key": "C"},
+        {"frame": 0, "event": "on_key_release", "key": "A"},
+        {"frame": 1, "event": "on_mouse_motion", "dy": 3},
+        {"frame": 10, "event": "on_key_press", "key": "P"},
+    ],
+    "recorded path": [
+        {"frame": 0, "event": "on_key_press", "key": "R"},
+        {"frame": 8, "event": "on_key_press", "key": "D"},
+        {"frame": 10, "event": "on_key_press", "key": "R"},
+        {"frame": 20, "event": "on_key_press", "key": "R"},
+        {"frame": 21, "event": "on_key_release", "key": "D"},
+        {"frame": 22, "event": "on_key_release", "key": "W"},
+        {"frame": 23, "event": "on_key_press", "key": "V"},
+        {"frame": 24, "event": "on_key_press", "key": "1"},
+    ],
+}
+
+
+def frame(dispatch, dt):
+    t3.update(dt, t3.controller)
+    t3.simulation.advance(dt)
+    dispatch("on_draw")
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    options = t3.HEADLESS
+    target = hl.Framebuffer(options.width, options.height)
+    target.bind()
+    dispatch = lambda *event: pyglet.event.EventDispatcher.dispatch_event(t3.controller, *event)
+
+    results = {}
+    for name, script in FLIGHTS.items():
+        events = hl.scriptEvents(script)
+        for i in range(WARMUP):
+            for event in events.get(i, []):
+                dispatch(*event)
+            frame(dispatch, options.dt)
+        results[name] = [peakArrays(frame, dispatch, options.dt) for _ in range(TRACED)]
+    target.clear()
+
+    for name, arrays in results.items():
+        print(f"{name:28} at most {max(arrays)} NumPy temporaries alive per frame, {arrays}")
+    assert t3.movement.curving and t3.controller.showCurve
+    assert all(max(arrays) == 0 for arrays in results.values())
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""Frustum culling of tarea3 against the unculled render, drawn offscreen.
+Each frame is drawn twice, with the frustum planes and scene.bvh and without
+them; both images must be the same, also after scenery is added to and removed
+from the scenario (the render list compiles again and the SceneBVH rebuilds).
+    python benchmarks/bench_culling.py [--size 1280x720]"""
+
+import sys, os
+import numpy as np
+import pyglet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "--headless" not in sys.argv:
+    sys.argv.append("--headless") # tarea3 reads its options when imported
+import libs.headless as hl
+import tarea3 as t3
+
+FRAMES = 20 # flown between the checks
+
+drawRenderList = t3.sg.drawRenderList
+culling = True
+
+
+def drawMaybeCulled(*args, planes=None, bvh=None, **kwargs):
+    if culling:
+        return drawRenderList(*args, planes=planes, bvh=bvh, **kwargs)
+    return drawRenderList(*args, **kwargs)
+
+
+def compare(name, dispatch, target):
+    """Same image with and without culling, returns the culled leaves"""
+    global culling
+    culling = True
+    dispatch("on_draw") # ship positions are read before its matrices are built, the second draw has them
+    dispatch("on_draw")
+    culled = target.read()
+    stats = dict(t3.scene.renderList.stats)
+    culling = False
+    dispatch("on_draw")
+    unculled = target.read()
+    culling = True
+
+    renderList, bvh = t3.scene.renderList, t3.scene.bvh
+    different = int(np.any(culled != unculled, axis=-1).sum())
+    print(f"{name:24} {stats['culledLeaves']:4} of {len(renderList.leaves)} leaves culled, {different} pixels differ")
+    assert bvh.version == renderList.version
+    assert len(bvh.slots) == len(t3.scene.scenario.childs)
+    assert different == 0
+    return stats["culledLeaves"]
+
+
+def fly(dispatch, dt, frames):
+    for _ in range(frames):
+        t3.update(dt, t3.controller)
+        t3.simulation.advance(dt)
+        dispatch("on_draw")
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    options = t3.HEADLESS
+    target = hl.Framebuffer(options.width, options.height)
+    target.bind()
+    dispatch = lambda *event: pyglet.event.EventDispatcher.dispatch_event(t3.controller, *event)
+    t3.sg.drawRenderList = drawMaybeCulled
+    scenario = t3.scene.scenario
+
+    culledLeaves = [compare("initial", dispatch, target)]
+    dispatch("on_key_press", pyglet.window.key.C, 0) # perspective, most of the scenery is out of view
+    dispatch("on_key_press", pyglet.window.key.W, 0)
+    fly(dispatch, options.dt, FRAMES)
+    culledLeaves.append(compare("flying", dispatch, target))
+
+    # In front of the ship, then the first scenery (and its shadow) away, every slot after it moves
+    ship = t3.sg.findPosition(t3.scene.squad, "shipRotation")
+    t3.scene.addScenery("build2_obj", "build2_tex", [ship[0, 0] + 4, ship[1, 0], 0], np.pi/2, 0, 1.4)
+    culledLeaves.append(compare("scenery added", dispatch, target))
+    first = scenario.childs[1] # after the floor
+    scenario.childs.remove(t3.sg.findNode(scenario, first.name + "_shadow"))
+    scenario.childs.remove(first)
+    culledLeaves.append(compare("scenery removed", dispatch, target))
+    fly(dispatch, options.dt, FRAMES)
+    culledLeaves.append(compare("flying again", dispatch, target))
+    target.clear()
+
+    assert max(culledLeaves) > 0
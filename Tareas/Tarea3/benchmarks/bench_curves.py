@@ -0,0 +1,64 @@
+# coding=utf-8
+"""Hermite curve evaluation: per sample loop of tarea3 against one batched product,
+and recording a path by concatenation against the growable HermitePath"""
+
+import sys, os, timeit
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import libs.curves as cv
+
+N, SEGMENTS, RECORDED = 50, 40, 200
+rng = np.random.default_rng(0)
+points, tangents = rng.normal(size=(RECORDED, 3)), rng.normal(size=(RECORDED, 3))
+
+# Previous implementation, one (3,4) @ (4,1) product per sample
+def evalCurve(M, N):
+    ts = np.linspace(0.0, 1.0, N)
+    curve = np.ndarray(shape=(N, 3), dtype=float)
+    for i in range(len(ts)):
+        T = np.array([[1, ts[i], ts[i]**2, ts[i]**3]]).T
+        curve[i, 0:3] = np.matmul(M, T).T
+    return curve
+
+def loopSegments():
+    return np.array([evalCurve(cv.hermiteGeometry(points[i], points[i+1], tangents[i], tangents[i+1]) @ cv.HERMITE, N) for i in range(SEGMENTS)])
+
+def batchSegments():
+    P, T = points[:SEGMENTS+1], tangents[:SEGMENTS+1]
+    return cv.evalSegments(cv.hermiteGeometry(P[:-1], P[1:], T[:-1], T[1:]), cv.HERMITE, N)[0]
+
+# Recording a long path point by point: the previous approach concatenated the
+# whole history and rebuilt the arc length tables on every point
+def recordConcatenate(count):
+    samples = np.zeros((0, N, 3))
+    derivatives = np.zeros((0, N, 3))
+    controlTangents = tangents[:count].copy()
+    for k in range(1, count):
+        if k > 1:
+            controlTangents[k-1] = points[k] - points[k-2]
+        first = max(k-2, 0)
+        P, T = points[first:k+1], controlTangents[first:k+1]
+        new, newTangents = cv.evalSegments(cv.hermiteGeometry(P[:-1], P[1:], T[:-1], T[1:]), cv.HERMITE, N)
+        keep = len(samples) - (len(P) - 2)
+        samples = np.concatenate([samples[:keep], new])
+        derivatives = np.concatenate([derivatives[:keep], newTangents])
+        arcLength = cv.ArcLengthPath(cv.joinSegments(samples), cv.joinSegments(derivatives))
+    return arcLength
+
+def recordPath(count):
+    path = cv.HermitePath(N)
+    for point, tangent in zip(points[:count], tangents[:count]):
+        path.append(point, tangent)
+    return path.arcLength
+
+def measure(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+if __name__ == '__main__':
+    assert np.allclose(loopSegments(), batchSegments())
+    loop, batch = measure(loopSegments, 5), measure(batchSegments, 200)
+    print(f"{SEGMENTS} segments x {N} samples: loop {loop:9.1f}us  batched {batch:7.1f}us  {loop/batch:6.1f}x")
+    assert np.allclose(recordConcatenate(SEGMENTS+1).frames, recordPath(SEGMENTS+1).frames)
+    for count in (RECORDED // 4, RECORDED):
+        rebuilt, stored = measure(lambda: recordConcatenate(count), 1), measure(lambda: recordPath(count), 1)
+        print(f"record {count} points: concatenate {rebuilt/1000:8.1f}ms  HermitePath {stored/1000:7.1f}ms  {rebuilt/stored:6.1f}x")
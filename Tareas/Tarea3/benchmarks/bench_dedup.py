@@ -0,0 +1,26 @@
+# coding=utf-8
+"""Vertex counts and buffer sizes of every asset with and without deduplication"""
+
+import sys, os, glob
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libs.obj_handler import read_OBJ_numpy
+from libs.assets_path import getAssetPath
+
+STRIDE = 8 # pos3 + uv2 + normal3
+
+# Size in bytes of the VBO and EBO of a shape
+def bufferBytes(shape):
+    return shape.vertices.nbytes + shape.indices.nbytes
+
+if __name__ == '__main__':
+    print(f"{'asset':<16}{'vertices':>10}{'dedup':>8}{'bytes':>11}{'dedup':>11}{'ratio':>7}")
+    for filename in sorted(glob.glob(getAssetPath("*.obj"))):
+        flat = read_OBJ_numpy(filename)
+        shared = read_OBJ_numpy(filename, dedup=True)
+        # Every triangle corner must still point to the same vertex data
+        flatVertices = flat.vertices.reshape(-1, STRIDE)[flat.indices]
+        sharedVertices = shared.vertices.reshape(-1, STRIDE)[shared.indices]
+        assert np.array_equal(flatVertices, sharedVertices)
+        before, after = len(flat.vertices)//STRIDE, len(shared.vertices)//STRIDE
+        print(f"{os.path.basename(filename):<16}{before:>10}{after:>8}{bufferBytes(flat):>11}{bufferBytes(shared):>11}{bufferBytes(flat)/bufferBytes(shared):>6.1f}x")
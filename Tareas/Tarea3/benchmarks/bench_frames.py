@@ -0,0 +1,186 @@
+# coding=utf-8
+"""Frame times of tarea3 per phase, drawing offscreen a scripted flight with a fixed dt.
+    python benchmarks/bench_frames.py [--frames 300] [--size 1280x720] [--script flight.json]
+                                      [--out headless_out] [--compare previous.json]
+Results go to bench_frames.json in the output directory, with p50/p95/p99 per phase;
+--compare prints them next to the results of another run, e.g. of another commit."""
+
+import sys, os, json, time, argparse
+import numpy as np
+import pyglet
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if "--headless" not in sys.argv:
+    sys.argv.append("--headless") # tarea3 reads its options when imported
+import libs.headless as hl
+import tarea3 as t3
+from libs.uniforms import UniformCacheMixin
+from OpenGL.GL import glFinish, glGetString, GL_RENDERER
+
+WARMUP = 10 # first frames compile shaders and fill caches, left out of the statistics
+PHASES = ("input", "movement", "traversal", "uniforms", "draw", "bvh", "swap", "other")
+
+# Typed setters of every pipeline (scene.pipeline, the instanced one of the queue, ...)
+SETTERS = ("set_float", "set_int", "set_uint", "set_vec3", "set_vec4", "set_mat4")
+
+# W/A/D turns, mouse up and down, recording control points with R, the special
+# move with P, then the recorded path shown with V and flown with 1
+FLIGHT = [
+    {"frame": 0, "event": "on_key_press", "key": "W"},
+    {"frame": 15, "event": "on_key_press", "key": "R"},
+    {"frame": 20, "event": "on_key_press", "key": "A"},
+    {"frame": 40, "event": "on_key_release", "key": "A"},
+    {"frame": 45, "event": "on_key_press", "key": "R"},
+    {"frame": 50, "event": "on_mouse_motion", "dy": 3},
+    {"frame": 70, "event": "on_mouse_motion", "dy": -3},
+    {"frame": 75, "event": "on_key_press", "key": "R"},
+    {"frame": 80, "event": "on_key_press", "key": "D"},
+    {"frame": 100, "event": "on_key_release", "key": "D"},
+    {"frame": 105, "event": "on_key_press", "key": "R"},
+    {"frame": 110, "event": "on_key_press", "key": "P"},
+    {"frame": 180, "event": "on_key_press", "key": "R"},
+    {"frame": 185, "event": "on_key_release", "key": "W"},
+    {"frame": 190, "event": "on_key_press", "key": "V"},
+    {"frame": 195, "event": "on_key_press", "key": "1"},
+]
+
+
+class PhaseTimer:
+    """
+    Seconds spent in each phase during the current frame. Functions are
+    wrapped to count their time in a phase, exclusively: the time of a wrapped
+    function called from another one only counts for the inner phase.
+    """
+    def __init__(self):
+        self.frame = {}
+        self.inner = [] # time of the wrapped calls inside each running one
+        self.samples = {phase: [] for phase in PHASES}
+
+    def wrap(self, phase, function):
+        def timed(*args, **kwargs):
+            self.inner.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.add(phase, elapsed - self.inner.pop())
+                if self.inner:
+                    self.inner[-1] += elapsed
+        return timed
+
+    def add(self, phase, seconds):
+        self.frame[phase] = self.frame.get(phase, 0.0) + seconds
+
+    def endFrame(self, total):
+        self.add("other", total - sum(self.frame.values()))
+        for phase in PHASES:
+            self.samples[phase].append(self.frame.get(phase, 0.0) * 1000)
+        self.frame = {}
+
+
+def instrument(timer):
+    """Wraps the functions of tarea3 behind each phase"""
+    renderList = t3.scene.renderList
+    t3.simulation.tick = timer.wrap("movement", t3.simulation.tick) # Movement.update
+    renderList.update = timer.wrap("traversal", renderList.update)
+    renderList.cull = timer.wrap("traversal", renderList.cull)
+    t3.sg.findPosition = timer.wrap("traversal", t3.sg.findPosition)
+    t3.sg.findNode = timer.wrap("traversal", t3.sg.findNode)
+    t3.cameraBlock.upload = timer.wrap("uniforms", t3.cameraBlock.upload)
+    t3.lightingBlock.upload = timer.wrap("uniforms", t3.lightingBlock.upload)
+    for name in SETTERS: # on the mixin class, so they still bind to each pipeline
+        setattr(UniformCacheMixin, name, timer.wrap("uniforms", getattr(UniformCacheMixin, name)))
+    t3.sg.drawRenderList = timer.wrap("draw", t3.sg.drawRenderList) # submitting to the queue
+    t3.renderQueue.flush = timer.wrap("draw", t3.renderQueue.flush)
+    t3.curveRenderer.update = timer.wrap("draw", t3.curveRenderer.update)
+    t3.curveRenderer.draw = timer.wrap("draw", t3.curveRenderer.draw)
+    t3.scene.bvh.refit = timer.wrap("bvh", t3.scene.bvh.refit)
+    t3.scene.bvh.raycast = timer.wrap("bvh", t3.scene.bvh.raycast)
+
+
+def statistics(values):
+    values = values[WARMUP:] if len(values) > WARMUP else values
+    if len(values) == 0:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "mean": float(np.mean(values)),
+        "p50": hl.percentile(values, 50),
+        "p95": hl.percentile(values, 95),
+        "p99": hl.percentile(values, 99),
+        "max": float(np.max(values)),
+    }
+
+
+def fly(options, events):
+    """Draws options.frames frames of the flight, timing every phase of each one"""
+    np.random.seed(0) # the special move picks its direction at random
+    timer = PhaseTimer()
+    instrument(timer)
+    # Straight to the handlers, as in hl.run; the own work of on_draw is left for "other"
+    dispatch = lambda *event: pyglet.event.EventDispatcher.dispatch_event(t3.controller, *event)
+    handleInput = timer.wrap("input", dispatch)
+    target = hl.Framebuffer(options.width, options.height)
+    target.bind()
+
+    frameTimes = []
+    for frame in range(options.frames):
+        start = time.perf_counter()
+        for event in events.get(frame, []):
+            handleInput(*event)
+        t3.update(options.dt, t3.controller)
+        t3.simulation.advance(options.dt)
+        dispatch("on_draw")
+        swap = time.perf_counter()
+        t3.controller.flip()
+        glFinish() # waits for the frame, most of the GPU time shows up here
+        end = time.perf_counter()
+        timer.add("swap", end - swap)
+        timer.endFrame(end - start)
+        frameTimes.append((end - start) * 1000)
+    target.clear()
+    return frameTimes, timer.samples
+
+
+def table(results):
+    return {"frame": results["frame"], **results["phases"]}
+
+
+def compare(results, previous):
+    print(f"{'':10} {'p50':>18} {'p95':>18} {'p99':>18}  ms, previous -> now")
+    now, before = table(results), table(previous)
+    for phase in now:
+        if phase in before:
+            cells = [f"{before[phase][q]:7.3f} -> {now[phase][q]:7.3f}" for q in ("p50", "p95", "p99")]
+            print(f"{phase:10} " + " ".join(f"{cell:>18}" for cell in cells))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compare", default=None, help="bench_frames.json of a previous run")
+    extra, _ = parser.parse_known_args()
+    options = t3.HEADLESS
+    events = hl.loadScript(options.script) if options.script is not None else hl.scriptEvents(FLIGHT)
+
+    frameTimes, samples = fly(options, events)
+    results = {
+        "renderer": glGetString(GL_RENDERER).decode(),
+        "size": [options.width, options.height],
+        "frames": options.frames,
+        "warmup": WARMUP,
+        "dt": options.dt,
+        "script": options.script or "FLIGHT",
+        "shipPosition": [float(value) for value in t3.movement.eye], # same state on every run of a script
+        "frame": statistics(frameTimes),
+        "phases": {phase: statistics(values) for phase, values in samples.items()},
+    }
+    os.makedirs(options.out, exist_ok=True)
+    with open(os.path.join(options.out, "bench_frames.json"), "w") as f:
+        json.dump(results, f, indent=2)
+
+    if extra.compare is not None:
+        with open(extra.compare) as f:
+            compare(results, json.load(f))
+    else:
+        print(f"{'':10} {'p50':>8} {'p95':>8} {'p99':>8}  ms, {results['renderer']}")
+        for phase, stats in table(results).items():
+            print(f"{phase:10} {stats['p50']:8.3f} {stats['p95']:8.3f} {stats['p99']:8.3f}")
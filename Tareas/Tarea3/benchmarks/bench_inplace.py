@@ -0,0 +1,96 @@
+# coding=utf-8
+"""NumPy allocations of the squad transforms per frame, checked with tracemalloc:
+lists of new matrices against out= buffers"""
+
+import sys, os, time, tracemalloc
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import libs.transformations as tr
+import libs.scene_graph as sg
+import libs.gpu_shape as gs
+
+FRAMES = 1000
+SHIPS = ("shipRotation", "shipRotation2", "shipRotation3")
+
+# Same structure as the squad of tarea3
+def buildScene():
+    root, squad, shadows = sg.SceneGraphNode("root"), sg.SceneGraphNode("squad"), []
+    root.childs += [squad]
+    for i, (name, x, y) in enumerate(zip(SHIPS, (0, -2, -2), (0, -1, 1))):
+        ship, shadow = sg.SceneGraphNode(name), sg.SceneGraphNode(name+"Shadow")
+        ship.transform = tr.translate(x, y, 0)
+        ship.childs += [gs.GPUShape()]
+        shadow.childs += [gs.GPUShape()]
+        squad.childs += [ship]
+        root.childs += [shadow]
+        shadows += [shadow]
+    renderList = sg.compileRenderList(root)
+    return squad, shadows, renderList
+
+def listFrame(squad, shadows, t):
+    ship_rot = [tr.rotationZ(t), tr.rotationY(t*0.5), tr.rotationX(t*0.2)]
+    positions = [sg.findPosition(squad, name) for name in SHIPS]
+    for shadow, ship in zip(shadows, positions):
+        shadow.transform = tr.matmul([tr.translate(ship[0][0], ship[1][0], 0.01)]+[tr.scale(1, 1, 0.01)]+ship_rot)
+    squad.transform = tr.matmul([tr.translate(t, 2*t, 1.5)]+ship_rot)
+    sg.updateTransforms(squad)
+
+shipMove, shipRot, shadowMove, shadowScale = tr.identity(), tr.identity(), tr.identity(), tr.scale(1, 1, 0.01)
+shipPositions = np.zeros((3, 4, 1), dtype=np.float32)
+
+def inplaceFrame(squad, shadows, t):
+    tr.trs((0, 0, 0), (t*0.2, t*0.5, t), (1, 1, 1), out=shipRot)
+    positions = (sg.findPosition(squad, name, out=position) for name, position in zip(SHIPS, shipPositions))
+    for shadow, ship in zip(shadows, positions):
+        tr.translate(ship[0][0], ship[1][0], 0.01, out=shadowMove)
+        tr.matmul([shadowMove, shadowScale, shipRot], out=shadow.transform)
+        shadow.markDirty()
+    tr.translate(t, 2*t, 1.5, out=shipMove)
+    tr.matmul([shipMove, shipRot], out=squad.transform)
+    squad.markDirty()
+    sg.updateTransforms(squad)
+
+numpyOnly = [tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)]
+
+def numpyBuffers():
+    return len(tracemalloc.take_snapshot().filter_traces(numpyOnly).traces)
+
+# Most NumPy data buffers alive at once while run(*args) executes, beyond the ones it started with.
+# Temporaries only live between two bytecodes, so the count is taken at every opcode of the python
+# code that runs; arrays freed inside a single C call, and the GL wrappers, are not looked into.
+SKIPPED = [os.sep + package + os.sep for package in ("OpenGL", "pyglet")]
+
+def peakArrays(run, *args):
+    tracemalloc.start()
+    base, most = numpyBuffers(), [0]
+    def check(frame, event, _arg):
+        if any(package in frame.f_code.co_filename for package in SKIPPED):
+            return None
+        frame.f_trace_opcodes = True
+        if event == 'opcode':
+            most[0] = max(most[0], numpyBuffers()-base)
+        return check
+    sys.settrace(check)
+    try:
+        run(*args)
+    finally:
+        sys.settrace(None)
+        tracemalloc.stop()
+    return most[0]
+
+def measure(frame):
+    squad, shadows, renderList = buildScene()
+    frame(squad, shadows, 0.0) # warm up, matmul allocates its scratch buffer once
+    start = time.perf_counter()
+    for i in range(1, FRAMES+1):
+        frame(squad, shadows, i*0.01)
+    elapsed = time.perf_counter()-start
+    return elapsed/FRAMES*1e6, peakArrays(frame, squad, shadows, 0.5), renderList.local.copy()
+
+if __name__ == '__main__':
+    listTime, listArrays, listLocal = measure(listFrame)
+    inplaceTime, inplaceArrays, inplaceLocal = measure(inplaceFrame)
+    assert np.allclose(listLocal, inplaceLocal, atol=1e-5)
+    assert inplaceArrays == 0
+    print(f"lists of matrices: {listTime:8.1f}us/frame  at most {listArrays} NumPy temporaries alive")
+    print(f"out= buffers:      {inplaceTime:8.1f}us/frame  at most {inplaceArrays} NumPy temporaries alive")
@@ -0,0 +1,26 @@
+# coding=utf-8
+"""Cold start of the full asset set: text OBJ parsing against the .meshbin cache"""
+
+import sys, os, glob, time, tempfile
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libs.obj_handler import read_OBJ_numpy, read_OBJ_cached
+from libs.assets_path import getAssetPath
+
+# Loads every asset with the given function, in seconds
+def loadAll(function, filenames):
+    start = time.perf_counter()
+    shapes = [function(filename) for filename in filenames]
+    return time.perf_counter()-start, shapes
+
+if __name__ == '__main__':
+    filenames = sorted(glob.glob(getAssetPath("*.obj")))
+    with tempfile.TemporaryDirectory() as cacheDir:
+        parsed, reference = loadAll(lambda f: read_OBJ_numpy(f, dedup=True), filenames)
+        compiled, _ = loadAll(lambda f: read_OBJ_cached(f, cacheDir=cacheDir), filenames)
+        cached, shapes = loadAll(lambda f: read_OBJ_cached(f, cacheDir=cacheDir), filenames)
+        for a, b in zip(reference, shapes):
+            assert np.array_equal(a.vertices, b.vertices) and np.array_equal(a.indices, b.indices)
+    print(f"parse OBJ:       {parsed*1000:8.1f}ms")
+    print(f"parse + compile: {compiled*1000:8.1f}ms")
+    print(f"load .meshbin:   {cached*1000:8.1f}ms")
@@ -0,0 +1,27 @@
+# coding=utf-8
+"""Compares read_OBJ2 against read_OBJ_numpy on every asset"""
+
+import sys, os, glob, time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libs.obj_handler import read_OBJ2, read_OBJ_numpy
+from libs.assets_path import getAssetPath
+
+# Best time of several runs, in seconds
+def bestTime(function, filename, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(filename)
+        best = min(best, time.perf_counter()-start)
+    return best, result
+
+if __name__ == '__main__':
+    print(f"{'asset':<16}{'read_OBJ2':>12}{'numpy':>12}{'speedup':>10}")
+    for filename in sorted(glob.glob(getAssetPath("*.obj"))):
+        slow, reference = bestTime(read_OBJ2, filename)
+        fast, shape = bestTime(read_OBJ_numpy, filename)
+        # Both loaders must give the same buffers
+        assert np.allclose(np.array(reference.vertices, dtype=np.float32), shape.vertices)
+        assert np.array_equal(np.array(reference.indices, dtype=np.uint32), shape.indices)
+        print(f"{os.path.basename(filename):<16}{slow*1000:>10.1f}ms{fast*1000:>10.1f}ms{slow/fast:>9.1f}x")
@@ -0,0 +1,50 @@
+# coding=utf-8
+"""Per matrix builders against the batched versions in transformations"""
+
+import sys, os, timeit
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import libs.transformations as tr
+
+N = 1000
+rng = np.random.default_rng(0)
+T, R, S = rng.uniform(-10, 10, (N, 3)), rng.uniform(-np.pi, np.pi, (N, 3)), rng.uniform(0.5, 2, (N, 3))
+
+def loopTRS():
+    return np.array([tr.matmul([tr.translate(*T[i]), tr.rotationZ(R[i, 2]), tr.rotationY(R[i, 1]), tr.rotationX(R[i, 0]), tr.scale(*S[i])]) for i in range(N)])
+
+def batchTRS():
+    return tr.trsBatch(T, R, S)
+
+def composedBatch():
+    return tr.matmul([tr.translateBatch(*T.T), tr.rotationZBatch(R[:, 2]), tr.rotationYBatch(R[:, 1]), tr.rotationXBatch(R[:, 0]), tr.scaleBatch(*S.T)])
+
+def loopRotations():
+    return np.array([tr.rotationZ(theta) for theta in R[:, 2]])
+
+def batchRotations():
+    return tr.rotationZBatch(R[:, 2])
+
+def singleChain():
+    return tr.matmul([tr.translate(*T[0]), tr.rotationZ(R[0, 2]), tr.rotationY(R[0, 1]), tr.rotationX(R[0, 0]), tr.scale(*S[0])])
+
+def singleTRS():
+    return tr.trs(T[0], R[0], S[0])
+
+# Time per call in microseconds
+def measure(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+if __name__ == '__main__':
+    assert np.allclose(loopTRS(), batchTRS(), atol=1e-5)
+    assert np.allclose(loopTRS(), composedBatch(), atol=1e-5)
+    assert np.allclose(loopRotations(), batchRotations())
+    assert np.allclose(singleChain(), singleTRS(), atol=1e-5)
+
+    for name, slow, fast, number in [
+            (f"{N} TRS matrices (fused)", loopTRS, batchTRS, 10),
+            (f"{N} TRS matrices (batched chain)", loopTRS, composedBatch, 10),
+            (f"{N} rotationZ", loopRotations, batchRotations, 10),
+            ("1 TRS matrix", singleChain, singleTRS, 2000)]:
+        slowTime, fastTime = measure(slow, number), measure(fast, number)
+        print(f"{name:<34}{slowTime:>12.1f}us{fastTime:>12.1f}us{slowTime/fastTime:>9.1f}x")
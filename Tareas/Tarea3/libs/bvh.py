@@ -0,0 +1,259 @@
+# coding=utf-8
+"""Bounding volume hierarchy over world space boxes, for culling, picking and proximity queries"""
+
+import numpy as np
+
+
+class BVH:
+    """
+    Binary tree of axis aligned boxes stored in flat arrays.
+    It is built once with a median split on the longest axis; when items
+    move, refit only recomputes the boxes on the path from each changed
+    leaf to the root, so the tree never has to be rebuilt for animations.
+    Queries visit only the branches whose boxes can contain an answer.
+    Refits, culls and raycasts work in buffers kept between calls, so the
+    ones done every frame create no arrays.
+    """
+    def __init__(self, items, aabbMin, aabbMax, leafSize=2):
+        self.items = list(items)
+        self.itemMin = np.array(aabbMin, dtype=np.float32).reshape(-1, 3)
+        self.itemMax = np.array(aabbMax, dtype=np.float32).reshape(-1, 3)
+        self.leafSize = leafSize
+        self.buffers = {}
+        self.build()
+
+    def scratch(self, name, shape, dtype=np.float32):
+        """Array kept between calls, created again only when its shape changes"""
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def build(self):
+        count = len(self.items)
+        capacity = max(1, 2 * count)
+        self.boxMin = np.zeros((capacity, 3), dtype=np.float32)
+        self.boxMax = np.zeros((capacity, 3), dtype=np.float32)
+        self.left = np.full(capacity, -1, dtype=np.int64)
+        self.right = np.full(capacity, -1, dtype=np.int64)
+        self.parent = np.full(capacity, -1, dtype=np.int64)
+        self.leafItems = {} # node -> array of item indices
+        self.itemLeaf = np.zeros(count, dtype=np.int64)
+        self.size = 0
+
+        if count > 0:
+            self._build(np.arange(count), -1)
+        else:
+            self.size = 1
+            self.boxMin[0], self.boxMax[0] = np.inf, -np.inf
+            self.leafItems[0] = np.arange(0)
+
+    def _newNode(self, parent):
+        node = self.size
+        self.size += 1
+        self.parent[node] = parent
+        return node
+
+    def _build(self, itemIndices, parent):
+        node = self._newNode(parent)
+        self.boxMin[node] = self.itemMin[itemIndices].min(axis=0)
+        self.boxMax[node] = self.itemMax[itemIndices].max(axis=0)
+
+        if len(itemIndices) <= self.leafSize:
+            self.leafItems[node] = itemIndices
+            self.itemLeaf[itemIndices] = node
+            return node
+
+        # Median split of the box centers along the longest axis
+        centers = (self.itemMin[itemIndices] + self.itemMax[itemIndices]) / 2
+        axis = int(np.argmax(self.boxMax[node] - self.boxMin[node]))
+        order = itemIndices[np.argsort(centers[:, axis], kind="stable")]
+        half = len(order) // 2
+        self.left[node] = self._build(order[:half], node)
+        self.right[node] = self._build(order[half:], node)
+        return node
+
+    def refit(self, itemIndices, aabbMin, aabbMax):
+        """New boxes for some items, only their paths to the root are updated"""
+        itemIndices = np.asarray(itemIndices, dtype=np.int64).reshape(-1)
+        self.itemMin[itemIndices] = aabbMin
+        self.itemMax[itemIndices] = aabbMax
+        self._refitPaths(set(int(self.itemLeaf[i]) for i in itemIndices))
+
+    def _refitPaths(self, pending):
+        """Boxes of the pending nodes and of their ancestors, while they change"""
+        newMin, newMax = self.scratch("newMin", (3,)), self.scratch("newMax", (3,))
+        changed = self.scratch("changed", (3,), bool)
+        while pending:
+            # Deepest nodes first so every parent sees its updated childs
+            node = max(pending)
+            pending.remove(node)
+            if node in self.leafItems:
+                leafItems = self.leafItems[node]
+                newMin[...], newMax[...] = self.itemMin[leafItems[0]], self.itemMax[leafItems[0]]
+                for i in leafItems[1:]:
+                    np.minimum(newMin, self.itemMin[i], out=newMin)
+                    np.maximum(newMax, self.itemMax[i], out=newMax)
+            else:
+                left, right = self.left[node], self.right[node]
+                np.minimum(self.boxMin[left], self.boxMin[right], out=newMin)
+                np.maximum(self.boxMax[left], self.boxMax[right], out=newMax)
+            if not (np.not_equal(newMin, self.boxMin[node], out=changed).any()
+                    or np.not_equal(newMax, self.boxMax[node], out=changed).any()):
+                continue
+            self.boxMin[node], self.boxMax[node] = newMin, newMax
+            if self.parent[node] >= 0:
+                pending.add(int(self.parent[node]))
+
+    def _traverse(self, overlaps, itemTest):
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if not overlaps(self.boxMin[node], self.boxMax[node]):
+                continue
+            if node in self.leafItems:
+                found += [int(i) for i in self.leafItems[node] if itemTest(self.itemMin[i], self.itemMax[i])]
+            else:
+                stack += [self.left[node], self.right[node]]
+        return found
+
+    def cullIndices(self, planes):
+        """Indices of the items whose box is not behind any of the frustum planes (tr.frustumPlanes)"""
+        normals, distances = planes[:, 0:3], planes[:, 3]
+        positive = np.greater_equal(normals, 0, out=self.scratch("positive", normals.shape, bool))
+        farthest = self.scratch("farthest", normals.shape)
+        signed = self.scratch("signed", distances.shape)
+
+        def inside(boxMin, boxMax):
+            # Corner furthest along each normal
+            np.copyto(farthest, boxMin)
+            np.copyto(farthest, boxMax, where=positive)
+            np.add(np.einsum('pk,pk->p', farthest, normals, out=signed), distances, out=signed)
+            return bool(signed.min() >= 0)
+
+        return self._traverse(inside, inside)
+
+    def cullMask(self, planes):
+        """Boolean mask over the items of cullIndices, a buffer reused by the next call"""
+        mask = self.scratch("itemVisible", (len(self.items),), bool)
+        mask.fill(False)
+        for i in self.cullIndices(planes):
+            mask[i] = True
+        return mask
+
+    def cull(self, planes):
+        """Items whose box is not behind any of the frustum planes (tr.frustumPlanes)"""
+        return [self.items[i] for i in self.cullIndices(planes)]
+
+    def query(self, center, radius):
+        """Items whose box is closer than radius to center"""
+        center = np.asarray(center, dtype=np.float32)
+
+        def near(boxMin, boxMax):
+            closest = np.clip(center, boxMin, boxMax)
+            return bool(np.sum((closest - center)**2) <= radius * radius)
+
+        return [self.items[i] for i in self._traverse(near, near)]
+
+    def raycast(self, origin, direction, maxDistance=np.inf):
+        """Nearest item whose box is hit by the ray, with its distance, or (None, inf)"""
+        np.copyto(self.scratch("origin", (3,), np.float64), origin)
+        origin, inverse = self.buffers["origin"], self.scratch("inverse", (3,), np.float64)
+        with np.errstate(divide="ignore"):
+            np.divide(1.0, direction, out=inverse)
+        t1, t2 = self.scratch("t1", (3,), np.float64), self.scratch("t2", (3,), np.float64)
+        lower, upper = self.scratch("lower", (3,), np.float64), self.scratch("upper", (3,), np.float64)
+
+        def hitDistance(boxMin, boxMax):
+            # Slab test, nan appears when the origin is on a slab with a zero direction
+            with np.errstate(invalid="ignore"):
+                np.multiply(np.subtract(boxMin, origin, out=t1), inverse, out=t1)
+                np.multiply(np.subtract(boxMax, origin, out=t2), inverse, out=t2)
+            # fmax and fmin skip the nans, as nanmax and nanmin would
+            near = float(np.fmax.reduce(np.minimum(t1, t2, out=lower)))
+            far = float(np.fmin.reduce(np.maximum(t1, t2, out=upper)))
+            if far < max(near, 0) or near > maxDistance:
+                return np.inf
+            return max(near, 0)
+
+        best, bestDistance = None, np.inf
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if hitDistance(self.boxMin[node], self.boxMax[node]) >= bestDistance:
+                continue
+            if node in self.leafItems:
+                for i in self.leafItems[node]:
+                    distance = hitDistance(self.itemMin[i], self.itemMax[i])
+                    if distance < bestDistance:
+                        best, bestDistance = self.items[i], distance
+            else:
+                stack += [self.left[node], self.right[node]]
+        return best, bestDistance
+
+
+class SceneBVH(BVH):
+    """
+    BVH over the childs of a scene graph node (for instance scenario),
+    using the world boxes of a compiled RenderList. refit compares those
+    boxes with the stored ones and only refits the nodes that moved.
+    owner maps every slot of the list to the item whose subtree holds it,
+    or -1, so RenderList.cull can leave those subtrees to the hierarchy.
+    Those slots belong to one compile of the list, the hierarchy is built
+    again when the list has compiled since (see rebuildIfStale).
+    """
+    def __init__(self, renderList, node, leafSize=2):
+        self.renderList = renderList
+        self.node = node
+        self.leafSize = leafSize
+
+        # The boxes need world matrices, the list may not have been drawn yet
+        renderList.update()
+        renderList.updateBounds()
+        self.rebuild()
+
+    def rebuildIfStale(self):
+        """Builds again if the list compiled after the last build, its slots changed.
+        The list must hold the boxes of this frame, as in RenderList.cull."""
+        if self.version != self.renderList.version:
+            self.rebuild()
+
+    def rebuild(self):
+        """Items, slots and hierarchy for the current childs of node and compile of the list"""
+        renderList, node = self.renderList, self.node
+        self.version = renderList.version
+        self.slots = np.array([child.slot for child in node.childs], dtype=np.int64)
+        self.owner = np.full(len(renderList.nodes), -1, dtype=np.int64)
+        self.owner[self.slots] = np.arange(len(self.slots))
+        for level in renderList.levels[1:]:
+            inherits = level[self.owner[level] < 0]
+            self.owner[inherits] = self.owner[renderList.parents[inherits]]
+
+        # What RenderList.cull needs: the slots it tests itself, the leaves
+        # below items with their item, and the number of nodes of each item
+        self.unowned = np.flatnonzero(self.owner < 0)
+        leafOwners = self.owner[renderList.leafSlots]
+        self.ownedLeaves = np.flatnonzero(leafOwners >= 0)
+        self.leafOwners = leafOwners[self.ownedLeaves]
+        self.ownedUnbounded = ~renderList.leafBounded[self.ownedLeaves]
+        self.itemNodes = np.bincount(self.owner[self.owner >= 0], minlength=len(self.slots))
+        super().__init__(list(node.childs), renderList.aabbMin[self.slots], renderList.aabbMax[self.slots], self.leafSize)
+
+    def refit(self, boundsUpdated=False):
+        """boundsUpdated when the list already has the boxes of this frame, e.g. after its cull"""
+        if not boundsUpdated:
+            self.renderList.updateBounds()
+        self.rebuildIfStale()
+        count = len(self.slots)
+        newMin = np.take(self.renderList.aabbMin, self.slots, axis=0, out=self.scratch("itemMin", (count, 3)), mode="clip")
+        newMax = np.take(self.renderList.aabbMax, self.slots, axis=0, out=self.scratch("itemMax", (count, 3)), mode="clip")
+        axes, moved = self.scratch("movedAxes", (count, 3), bool), self.scratch("moved", (count,), bool)
+        np.any(np.not_equal(newMin, self.itemMin, out=axes), axis=1, out=moved)
+        np.logical_or(moved, np.any(np.not_equal(newMax, self.itemMax, out=axes), axis=1, out=self.scratch("movedMax", (count,), bool)), out=moved)
+        leaves = set(int(self.itemLeaf[i]) for i in range(count) if moved[i])
+        if leaves:
+            np.copyto(self.itemMin, newMin, where=moved[:, None])
+            np.copyto(self.itemMax, newMax, where=moved[:, None])
+            self._refitPaths(leaves)
+        return int(moved.sum())
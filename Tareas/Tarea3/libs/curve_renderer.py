@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Persistent GPU buffer to draw a polyline such as the Hermite curve"""
+
+from OpenGL.GL import *
+import numpy as np
+
+# We will use 32 bits data, so floats have 4 bytes
+SIZE_IN_BYTES = 4
+
+
+class CurveRenderer:
+    """
+    Keeps one VAO and a growable VBO for a (N,3) array of points.
+    The buffer doubles its capacity when the curve outgrows it and is only
+    refilled when update receives a different array, so drawing an unchanged
+    curve is a single draw call with no allocations. Curves that change in
+    place, like HermitePath.curve, pass their version instead, and the
+    first changed point to upload only the end that changed.
+    """
+    def __init__(self, program, capacity=256):
+        self.program = program # pyglet ShaderProgram with an "in vec3 position"
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        self.capacity = 0
+        self.count = 0
+        self.source = None
+        self.version = None
+        self.matrices = np.empty((2, 16), dtype=np.float32) # projection and view in column major order
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, capacity * 3 * SIZE_IN_BYTES, None, GL_DYNAMIC_DRAW)
+
+        position = glGetAttribLocation(self.program.id, "position")
+        glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 3 * SIZE_IN_BYTES, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(position)
+        glBindVertexArray(0)
+
+    def update(self, curve, version=None, changedFrom=0):
+        """Uploads the curve if it is not the one already in the buffer.
+        With a version, the curve is uploaded when the version changes, from
+        changedFrom on if the buffer holds the previous version."""
+        if curve is None:
+            self.source, self.count, self.version = None, 0, None
+            return
+        if version is None and curve is self.source and len(curve) == self.count:
+            return
+        if version is not None and version == self.version:
+            return
+
+        start = 0
+        if version is not None and self.version is not None and version == self.version + 1:
+            start = min(changedFrom, self.count)
+        if len(curve) > self.capacity:
+            capacity = self.capacity
+            while capacity < len(curve):
+                capacity *= 2
+            self._allocate(capacity)
+            start = 0
+
+        points = np.ascontiguousarray(curve[start:], dtype=np.float32)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, start * 3 * SIZE_IN_BYTES, points.nbytes, points)
+        self.source, self.count, self.version = curve, len(curve), version
+
+    def draw(self, projection, view, mode=GL_LINES):
+        if self.count == 0:
+            return
+        self.program.use()
+        np.copyto(self.matrices[0].reshape(4, 4), projection.T)
+        np.copyto(self.matrices[1].reshape(4, 4), view.T)
+        self.program["projection"], self.program["view"] = self.matrices
+        glBindVertexArray(self.vao)
+        glDrawArrays(mode, 0, self.count)
+        glBindVertexArray(0)
+
+    def clear(self):
+        """Freeing GPU memory"""
+
+        glDeleteBuffers(1, [self.vbo])
+        glDeleteVertexArrays(1, [self.vao])
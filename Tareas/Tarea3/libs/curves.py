@@ -0,0 +1,271 @@
+# coding=utf-8
+"""Cubic curves evaluated for many segments at once"""
+
+import numpy as np
+import libs.quaternions as qt
+
+# Basis matrices: a segment is G @ basis @ [1, t, t^2, t^3], with the
+# geometry G holding the control data of the segment as its 4 columns
+
+# G = [P1, P2, T1, T2], from P1 to P2 with tangents T1 and T2
+HERMITE = np.array([
+    [1, 0, -3, 2],
+    [0, 0, 3, -2],
+    [0, 1, -2, 1],
+    [0, 0, -1, 1]], dtype=np.float64)
+
+# G = [P0, P1, P2, P3], from P0 to P3 pulled towards P1 and P2
+BEZIER = np.array([
+    [1, -3, 3, -1],
+    [0, 3, -6, 3],
+    [0, 0, 3, -3],
+    [0, 0, 0, 1]], dtype=np.float64)
+
+# G = [P0, P1, P2, P3], from P1 to P2 through every point
+CATMULL_ROM = 0.5 * np.array([
+    [0, -1, 2, -1],
+    [2, 0, -5, 3],
+    [0, 1, 4, -3],
+    [0, 0, -1, 1]], dtype=np.float64)
+
+
+def hermiteGeometry(P1, P2, T1, T2):
+    """(segments,3,4) geometry from (segments,3) arrays of endpoints and tangents"""
+    return np.stack([P1, P2, T1, T2], axis=-1).astype(np.float64)
+
+
+def bezierGeometry(controls):
+    """Consecutive segments sharing endpoints, from (3*segments+1,3) control points"""
+    controls = np.asarray(controls, dtype=np.float64)
+    starts = np.arange(0, len(controls) - 1, 3)
+    return np.stack([controls[starts + i] for i in range(4)], axis=-1)
+
+
+def catmullRomGeometry(points):
+    """One segment between each pair of inner points of (n,3) points, n-3 segments"""
+    points = np.asarray(points, dtype=np.float64)
+    return np.stack([points[i:len(points) - 3 + i] for i in range(4)], axis=-1)
+
+
+def powerBasis(N):
+    """(4,N) columns [1, t, t^2, t^3] and their derivatives for N values of t in [0, 1]"""
+    ts = np.linspace(0.0, 1.0, N)
+    T = np.stack([np.ones(N), ts, ts**2, ts**3])
+    dT = np.stack([np.zeros(N), np.ones(N), 2*ts, 3*ts**2])
+    return T, dT
+
+
+def evalSegments(G, basis, N):
+    """Points and tangents (derivatives in t) of every segment, both (segments,N,3).
+    All segments come from one (segments,3,4) @ (4,N) product each."""
+    M = np.matmul(G, basis)
+    T, dT = powerBasis(N)
+    points = np.matmul(M, T).transpose(0, 2, 1)
+    tangents = np.matmul(M, dT).transpose(0, 2, 1)
+    return points, tangents
+
+
+def joinSegments(samples):
+    """(segments,N,3) samples as one polyline, consecutive segments share their endpoint"""
+    if len(samples) == 0:
+        return np.zeros((0, 3))
+    return np.concatenate([samples[:, :-1].reshape(-1, 3), samples[-1, -1:]])
+
+
+class GrowableBuffer:
+    """
+    Rows of a fixed width in a buffer that doubles its capacity when it is
+    full, so growing by a row is amortized O(1). view() is the filled part,
+    a contiguous array that stays valid until the buffer grows again.
+    """
+    def __init__(self, width, capacity=64):
+        self.buffer = np.empty((capacity, width))
+        self.count = 0
+
+    def resize(self, count):
+        if count > len(self.buffer):
+            capacity = len(self.buffer)
+            while capacity < count:
+                capacity *= 2
+            buffer = np.empty((capacity, self.buffer.shape[1]))
+            buffer[:self.count] = self.buffer[:self.count]
+            self.buffer = buffer
+        self.count = count
+
+    def append(self, row):
+        self.resize(self.count + 1)
+        self.buffer[self.count - 1] = row
+
+    def view(self):
+        return self.buffer[:self.count]
+
+
+class HermitePath:
+    """
+    Hermite curve through points recorded one by one, each with a tangent.
+    Appending a point changes the tangent of the previous one to the chord
+    between its neighbours, so only the last segment and the new one are
+    evaluated again. The samples of every segment are joined in a growable
+    buffer, segment k owning the span of samples k*(N-1) to k*(N-1)+N-1, so
+    an append writes those two spans in place and never copies the rest.
+    version counts the edits and changedFrom is the first sample the last
+    one rewrote, for consumers that keep their own copy (e.g. a GPU buffer).
+    """
+    def __init__(self, N):
+        self.N = N # samples per segment
+        self.clear()
+
+    def clear(self):
+        self.controlPoints = GrowableBuffer(3)
+        self.controlTangents = GrowableBuffer(3)
+        self.points = GrowableBuffer(3) # joined samples
+        self.derivatives = GrowableBuffer(3)
+        self.arcLength = None # ArcLengthPath of the curve, updated on every edit
+        self.version = getattr(self, "version", -1) + 1 # keeps growing, clearing is an edit too
+        self.changedFrom = 0
+
+    def __len__(self):
+        return self.controlPoints.count
+
+    @property
+    def curve(self):
+        """(samples,3) view of the joined curve, None without segments"""
+        return self.points.view() if len(self) > 1 else None
+
+    @property
+    def tangents(self):
+        return self.derivatives.view() if len(self) > 1 else None
+
+    def span(self, segment):
+        start = segment * (self.N - 1)
+        return start, start + self.N
+
+    def append(self, point, tangent):
+        self.controlPoints.append(point)
+        self.controlTangents.append(tangent)
+        if len(self) < 2:
+            return
+
+        # Segments ending at the last two points, the first one only when it exists
+        P, T = self.controlPoints.view(), self.controlTangents.view()
+        changed = 1
+        if len(self) > 2:
+            T[-2] = P[-1] - P[-3]
+            changed = 2
+        P, T = P[-changed-1:], T[-changed-1:]
+        points, tangents = evalSegments(hermiteGeometry(P[:-1], P[1:], T[:-1], T[1:]), HERMITE, self.N)
+
+        start, _ = self.span(len(self) - 1 - changed)
+        _, end = self.span(len(self) - 2)
+        self.points.resize(end)
+        self.derivatives.resize(end)
+        self.points.buffer[start:end] = joinSegments(points)
+        self.derivatives.buffer[start:end] = joinSegments(tangents)
+
+        if self.arcLength is None:
+            self.arcLength = ArcLengthPath(self.curve, self.tangents)
+        else:
+            self.arcLength.update(self.curve, self.tangents, start)
+        self.version += 1
+        self.changedFrom = start
+
+
+class ArcLengthPath:
+    """
+    A polyline of curve samples indexed by the distance s travelled along it.
+    The cumulative length at each sample, the unit tangents and a frame per
+    sample are computed once, then position, tangent and frame of any s (or
+    array of them) are a binary search and an interpolation between samples.
+    Frames are quaternions: the first faces the first tangent with no roll
+    and each next one is the previous turned by the shortest arc between
+    their tangents, so they never flip.
+    When only the end of the polyline changes, update recomputes the tables
+    from the first changed sample on.
+    """
+    def __init__(self, points, tangents):
+        self._distances = GrowableBuffer(1)
+        self._tangents = GrowableBuffer(3)
+        self._frames = GrowableBuffer(4)
+        self.update(points, tangents, 0)
+
+    def update(self, points, tangents, start):
+        """Tables for points and tangents, where samples before start did not change"""
+        self.points = np.asarray(points, dtype=np.float64)
+        n = len(self.points)
+        start = max(min(start, self._distances.count, n - 1), 0)
+        for table in (self._distances, self._tangents, self._frames):
+            table.resize(n)
+        distances, unit, frames = self._distances.buffer[:n, 0], self._tangents.buffer[:n], self._frames.buffer[:n]
+
+        first = max(start, 1)
+        distances[0] = 0.0
+        chords = np.diff(self.points[first - 1:], axis=0)
+        distances[first:] = distances[first - 1] + np.cumsum(np.linalg.norm(chords, axis=1))
+
+        # Zero derivatives (e.g. a zero tangent at a control point) take the chord direction
+        changed = np.array(tangents[start:], dtype=np.float64)
+        norms = np.linalg.norm(changed, axis=1)
+        flat = norms < 1e-9
+        if np.any(flat):
+            chords = np.diff(self.points[start:], axis=0) if n - start > 1 else np.diff(self.points[-2:], axis=0)
+            chords = np.vstack([chords, chords[-1:]])
+            changed[flat] = chords[flat]
+            norms[flat] = np.linalg.norm(chords[flat], axis=1)
+        # A sample with no direction at all (repeated points) keeps the previous one
+        for i in np.flatnonzero(norms < 1e-9):
+            if i > 0:
+                changed[i] = changed[i - 1] / norms[i - 1]
+            else:
+                changed[i] = unit[start - 1] if start > 0 else [1, 0, 0]
+            norms[i] = 1
+        unit[start:] = changed / norms[:, None]
+
+        if start == 0:
+            frames[0] = qt.fromEuler(0, -np.arcsin(np.clip(unit[0, 2], -1, 1)), np.arctan2(unit[0, 1], unit[0, 0]))
+        frames[first - 1:] = qt.accumulate(frames[first - 1], qt.fromTo(unit[first - 1:-1], unit[first:]))
+
+        self.distances, self.tangents, self.frames = distances, unit, frames
+        self.length = distances[-1]
+
+    def locate(self, s):
+        """Sample index before s and how far s is towards the next one, in [0, 1]"""
+        if np.isscalar(s): # on python numbers, no arrays for a single distance
+            s = min(max(float(s), 0.0), float(self.length))
+            i = min(max(int(np.searchsorted(self.distances, s, side="right")) - 1, 0), len(self.distances) - 2)
+            span = float(self.distances[i + 1] - self.distances[i])
+            return i, (s - float(self.distances[i])) / span if span > 0 else 0.0
+        s = np.clip(s, 0, self.length)
+        i = np.clip(np.searchsorted(self.distances, s, side="right") - 1, 0, len(self.distances) - 2)
+        span = self.distances[i + 1] - self.distances[i]
+        alpha = np.where(span > 0, (s - self.distances[i]) / np.where(span > 0, span, 1), 0.0)
+        return i, alpha
+
+    # position, tangent and frame of a single s also take an out array to write into
+
+    def position(self, s, out=None):
+        i, alpha = self.locate(s)
+        if out is not None:
+            return _lerp(self.points[i], self.points[i + 1], alpha, out)
+        alpha = np.asarray(alpha)[..., None]
+        return self.points[i] * (1 - alpha) + self.points[i + 1] * alpha
+
+    def tangent(self, s, out=None):
+        i, alpha = self.locate(s)
+        if out is not None:
+            _lerp(self.tangents[i], self.tangents[i + 1], alpha, out)
+            out /= np.linalg.norm(out)
+            return out
+        alpha = np.asarray(alpha)[..., None]
+        tangent = self.tangents[i] * (1 - alpha) + self.tangents[i + 1] * alpha
+        return tangent / np.linalg.norm(tangent, axis=-1, keepdims=True)
+
+    def frame(self, s, out=None):
+        i, alpha = self.locate(s)
+        return qt.slerp(self.frames[i], self.frames[i + 1], alpha, out)
+
+
+def _lerp(a, b, alpha, out):
+    np.subtract(b, a, out=out)
+    out *= alpha
+    out += a
+    return out
@@ -8,6 +8,8 @@ from PIL import Image
 
 import libs.basic_shapes as bs
 from libs.gpu_shape import GPUShape
+from libs.uniforms import UniformCacheMixin
+from libs.shaders import decodeImage, uploadTexture
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
@@ -21,35 +23,11 @@ def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMo
      # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
      # filterMode: GL_LINEAR, GL_NEAREST
     texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-    
-    # texture wrapping params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, sWrapMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, tWrapMode)
-
-    # texture filtering params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilterMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, maxFilterMode)
-    
-    image = Image.open(imgName)
-    img_data = np.array(image, np.uint8)
-
-    if image.mode == "RGB":
-        internalFormat = GL_RGB
-        format = GL_RGB
-    elif image.mode == "RGBA":
-        internalFormat = GL_RGBA
-        format = GL_RGBA
-    else:
-        print("Image mode not supported.")
-        raise Exception()
-
-    glTexImage2D(GL_TEXTURE_2D, 0, internalFormat, image.size[0], image.size[1], 0, format, GL_UNSIGNED_BYTE, img_data)
-
+    uploadTexture(texture, decodeImage(imgName), sWrapMode, tWrapMode, minFilterMode, maxFilterMode)
     return texture
 
 
-class SimpleShaderProgram:
+class SimpleShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -85,6 +63,7 @@ class SimpleShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -95,11 +74,11 @@ class SimpleShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color specification => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
@@ -118,7 +97,7 @@ class SimpleShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTextureShaderProgram:
+class SimpleTextureShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -160,6 +139,7 @@ class SimpleTextureShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
     def setupVAO(self, gpuShape):
         glBindVertexArray(gpuShape.vao)
@@ -168,11 +148,11 @@ class SimpleTextureShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
+        texCoords = self.attribLocation("texCoords")
         glVertexAttribPointer(texCoords, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
         glEnableVertexAttribArray(texCoords)
 
@@ -192,7 +172,7 @@ class SimpleTextureShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTransformShaderProgram:
+class SimpleTransformShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -233,6 +213,7 @@ class SimpleTransformShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
     def setupVAO(self, gpuShape):
         glBindVertexArray(gpuShape.vao)
@@ -241,11 +222,11 @@ class SimpleTransformShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color specification => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
@@ -264,7 +245,7 @@ class SimpleTransformShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTextureTransformShaderProgram:
+class SimpleTextureTransformShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -309,6 +290,7 @@ class SimpleTextureTransformShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -319,11 +301,11 @@ class SimpleTextureTransformShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
+        texCoords = self.attribLocation("texCoords")
         glVertexAttribPointer(texCoords, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(3 * SIZE_IN_BYTES))
         glEnableVertexAttribArray(texCoords)
 
@@ -342,7 +324,7 @@ class SimpleTextureTransformShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleModelViewProjectionShaderProgram:
+class SimpleModelViewProjectionShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -383,6 +365,7 @@ class SimpleModelViewProjectionShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -393,11 +376,11 @@ class SimpleModelViewProjectionShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color specification => 3*4 + 3*4 = 24 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 24, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
@@ -416,7 +399,7 @@ class SimpleModelViewProjectionShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTextureModelViewProjectionShaderProgram:
+class SimpleTextureModelViewProjectionShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -462,6 +445,7 @@ class SimpleTextureModelViewProjectionShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -472,11 +456,11 @@ class SimpleTextureModelViewProjectionShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + 2d texture coordinates => 3*4 + 2*4 = 20 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        texCoords = glGetAttribLocation(self.shaderProgram, "texCoords")
+        texCoords = self.attribLocation("texCoords")
         glVertexAttribPointer(texCoords, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
         glEnableVertexAttribArray(texCoords)
 
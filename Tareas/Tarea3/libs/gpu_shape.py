@@ -12,6 +12,10 @@ __license__ = "MIT"
 # 1 byte = 8 bits
 SIZE_IN_BYTES = 4
 
+# Textures owned by a cache (e.g. the texture manager) and shared by many
+# shapes, clear() leaves them for their owner to free
+sharedTextures = set()
+
 class GPUShape:
     def __init__(self):
         """VAO, VBO, EBO and texture handlers to GPU memory"""
@@ -21,6 +25,11 @@ class GPUShape:
         self.ebo = None
         self.texture = None
         self.size = None
+        self.layout = "obj"
+        self.aabbMin = None # local bounds, set by setBounds
+        self.aabbMax = None
+        self.center = None
+        self.radius = None
 
     def initBuffers(self):
         """Convenience function for initialization of OpenGL buffers.
@@ -35,6 +44,18 @@ class GPUShape:
         self.ebo = glGenBuffers(1)
         return self
 
+    def setBounds(self, vertices, stride):
+        """Axis aligned box and bounding sphere of the positions (first 3 floats of each vertex)"""
+        vertices = np.asarray(vertices, dtype=np.float32)
+        if len(vertices) == 0 or len(vertices) % stride != 0:
+            return self
+        positions = vertices.reshape(-1, stride)[:, 0:3]
+        self.aabbMin = positions.min(axis=0)
+        self.aabbMax = positions.max(axis=0)
+        self.center = (self.aabbMin + self.aabbMax) / 2
+        self.radius = float(np.linalg.norm(positions - self.center, axis=1).max())
+        return self
+
     def __str__(self):
         return "vao=" + str(self.vao) +\
             "  vbo=" + str(self.vbo) +\
@@ -43,8 +64,9 @@ class GPUShape:
 
     def fillBuffers(self, vertices, indices, usage):
 
-        vertexData = np.array(vertices, dtype=np.float32)
-        indices = np.array(indices, dtype=np.uint32)
+        # Meshes of read_OBJ_numpy and the meshbin cache already have these types, no copy then
+        vertexData = np.asarray(vertices, dtype=np.float32)
+        indices = np.asarray(indices, dtype=np.uint32)
 
         self.size = len(indices)
 
@@ -57,7 +79,7 @@ class GPUShape:
     def clear(self):
         """Freeing GPU memory"""
 
-        if self.texture != None:
+        if self.texture != None and self.texture not in sharedTextures:
             glDeleteTextures(1, [self.texture])
         
         if self.ebo != None:
@@ -70,6 +92,49 @@ class GPUShape:
             glDeleteVertexArrays(1, [self.vao])
 
 
+class InstancedGPUShape(GPUShape):
+    """
+    Draws the VBO and EBO of another GPUShape many times in one call.
+    It owns its VAO and a buffer with one model matrix per instance, the
+    mesh buffers and the texture still belong to the original shape.
+    """
+    def __init__(self, gpuShape):
+        super().__init__()
+        self.vbo = gpuShape.vbo
+        self.ebo = gpuShape.ebo
+        self.size = gpuShape.size
+        self.texture = gpuShape.texture
+        self.layout = gpuShape.layout
+        self.aabbMin, self.aabbMax = gpuShape.aabbMin, gpuShape.aabbMax
+        self.center, self.radius = gpuShape.center, gpuShape.radius
+        self.vao = glGenVertexArrays(1)
+        self.instanceVbo = glGenBuffers(1)
+        self.capacity = 0
+        self.count = 0
+        self.staging = np.empty((0, 4, 4), dtype=np.float32) # CPU copy of the instance buffer
+
+    def fillInstances(self, models, usage=GL_DYNAMIC_DRAW):
+        """models is a (N,4,4) stack or a sequence of row major matrices, as in transformations"""
+        self.count = len(models)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceVbo)
+        if self.count > self.capacity:
+            self.capacity = max(self.count, 2 * self.capacity)
+            self.staging = np.empty((self.capacity, 4, 4), dtype=np.float32)
+            glBufferData(GL_ARRAY_BUFFER, self.capacity * 16 * SIZE_IN_BYTES, None, usage)
+
+        # GLSL builds a mat4 attribute from columns, so each matrix is sent transposed
+        for i, model in enumerate(models):
+            self.staging[i] = model.T
+        glBufferSubData(GL_ARRAY_BUFFER, 0, self.count * 16 * SIZE_IN_BYTES, self.staging)
+
+    def clear(self):
+        """Freeing the GPU memory of this object only, the mesh is not touched"""
+
+        glDeleteBuffers(1, [self.instanceVbo])
+        glDeleteVertexArrays(1, [self.vao])
+
+
 def createGPUShape(pipeline, shape, obj="obj"):
     """Shortcut for the typical way to create a GPUShape.
     Please consider that GL_STATIC_DRAW is not always the best way to draw.
@@ -78,6 +143,9 @@ def createGPUShape(pipeline, shape, obj="obj"):
     bump mapping, alternative ways to represent of vertices, etc.
     """
     gpuShape = GPUShape().initBuffers()
+    gpuShape.layout = obj
     pipeline.setupVAO(gpuShape, obj)
     gpuShape.fillBuffers(shape.vertices, shape.indices, GL_STATIC_DRAW)
+    # Vertices are 32 bytes for "obj" and 20 bytes otherwise, as in setupVAO
+    gpuShape.setBounds(shape.vertices, 8 if obj == "obj" else 5)
     return gpuShape
@@ -0,0 +1,146 @@
+# coding=utf-8
+"""Headless runs: an offscreen EGL context, a framebuffer object as target and
+scripted input, to draw a scene for a number of frames without a display"""
+
+import os, sys, json, time, argparse
+# PyOpenGL picks its platform on first import, it has to look for the EGL context of pyglet
+if "--headless" in sys.argv:
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+import numpy as np
+import pyglet
+from OpenGL.GL import *
+from PIL import Image
+
+
+def parseOptions(argv):
+    """Headless options from the command line, None for a normal windowed run.
+    It has to run before pyglet.window or pyglet.canvas are used, since it
+    switches pyglet to its EGL headless platform."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless", action="store_true", help="draw offscreen instead of opening a window")
+    parser.add_argument("--frames", type=int, default=300, help="frames to draw")
+    parser.add_argument("--size", default="1280x720", help="WIDTHxHEIGHT of the target")
+    parser.add_argument("--dt", type=float, default=1/60, help="seconds of scene time per frame")
+    parser.add_argument("--script", default=None, help="JSON list of input events, see loadScript")
+    parser.add_argument("--out", default="headless_out", help="directory for timings and frames")
+    parser.add_argument("--save-every", type=int, default=0, help="write every n-th frame as PNG, 0 for none")
+    options, _ = parser.parse_known_args(argv)
+    if not options.headless:
+        return None
+    if options.frames < 1: # timings of no frames have no mean nor max
+        parser.error(f"--frames must be at least 1, got {options.frames}")
+
+    options.width, options.height = (int(value) for value in options.size.lower().split("x"))
+    pyglet.options["headless"] = True
+    return options
+
+
+def loadScript(filename):
+    """Input events by frame, from a JSON list such as
+    [{"frame": 0, "event": "on_key_press", "key": "W"},
+     {"frame": 40, "event": "on_mouse_motion", "dy": 3},
+     {"frame": 90, "event": "on_key_release", "key": "W", "modifiers": 16}]
+    Keys are pyglet.window.key names, digits may be written as "1"."""
+    if filename is None:
+        return {}
+    with open(filename) as f:
+        entries = json.load(f)
+    return scriptEvents(entries)
+
+
+def scriptEvents(entries):
+    events = {}
+    for entry in entries:
+        if entry["event"] in ("on_key_press", "on_key_release"):
+            key = str(entry["key"])
+            symbol = getattr(pyglet.window.key, "_"+key if key.isdigit() else key.upper())
+            args = (symbol, entry.get("modifiers", 0))
+        elif entry["event"] == "on_mouse_motion":
+            args = (entry.get("x", 0), entry.get("y", 0), entry.get("dx", 0), entry.get("dy", 0))
+        else:
+            raise ValueError(f"Unknown scripted event {entry['event']}")
+        events.setdefault(entry["frame"], []).append((entry["event"],) + args)
+    return events
+
+
+class Framebuffer:
+    """Color and depth renderbuffers to draw into instead of the window"""
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.fbo = glGenFramebuffers(1)
+        self.color, self.depth = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, width, height)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"Incomplete framebuffer: {status}")
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+
+    def read(self):
+        """Current image as a (height,width,3) uint8 array, top row first"""
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        data = glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE)
+        return np.flipud(np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3))
+
+    def clear(self):
+        """Freeing GPU memory"""
+        glDeleteFramebuffers(1, [self.fbo])
+        glDeleteRenderbuffers(2, [self.color, self.depth])
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) > 0 else 0.0
+
+
+def run(window, options, step, events=None):
+    """Draws options.frames frames of window into a framebuffer object.
+    Before each frame the scripted events of that frame are dispatched to the
+    window handlers and step(dt) advances the scene clocks by options.dt, so
+    runs are repeatable. Frame times, from step to a finished draw, go to
+    timings.json in options.out with every n-th frame as PNG if requested."""
+    events = loadScript(options.script) if events is None else events
+    os.makedirs(options.out, exist_ok=True)
+    target = Framebuffer(options.width, options.height)
+    target.bind()
+
+    # Without pyglet.app's event loop the window would queue its events, handlers run right away instead
+    dispatch = lambda *event: pyglet.event.EventDispatcher.dispatch_event(window, *event)
+    frameTimes = []
+    for frame in range(options.frames):
+        for event in events.get(frame, []):
+            dispatch(*event)
+        start = time.perf_counter()
+        step(options.dt)
+        dispatch("on_draw")
+        glFinish()
+        frameTimes.append((time.perf_counter() - start) * 1000)
+        if options.save_every > 0 and frame % options.save_every == 0:
+            Image.fromarray(target.read()).save(os.path.join(options.out, f"frame_{frame:05d}.png"))
+
+    timings = {
+        "renderer": glGetString(GL_RENDERER).decode(),
+        "size": [options.width, options.height],
+        "frames": options.frames,
+        "dt": options.dt,
+        "frameMs": {
+            "mean": float(np.mean(frameTimes)),
+            "p50": percentile(frameTimes, 50),
+            "p95": percentile(frameTimes, 95),
+            "max": float(np.max(frameTimes)),
+        },
+        "frameTimes": frameTimes,
+    }
+    with open(os.path.join(options.out, "timings.json"), "w") as f:
+        json.dump(timings, f, indent=2)
+    target.clear()
+    return timings
@@ -3,14 +3,17 @@
 
 from OpenGL.GL import *
 import OpenGL.GL.shaders
-from libs.gpu_shape import GPUShape
+from libs.gpu_shape import GPUShape, InstancedGPUShape
+from libs.uniforms import UniformCacheMixin
+from libs.shader_cache import compileProgram
+from libs.uniform_blocks import bindUniformBlocks
 
 import sys
 import os.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from libs.assets_path import getAssetPath
 
-class SimpleFlatShaderProgram():
+class SimpleFlatShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -89,9 +92,8 @@ class SimpleFlatShaderProgram():
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -102,15 +104,15 @@ class SimpleFlatShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
@@ -129,7 +131,7 @@ class SimpleFlatShaderProgram():
         glBindVertexArray(0)
 
 
-class SimpleTextureFlatShaderProgram():
+class SimpleTextureFlatShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -215,9 +217,8 @@ class SimpleTextureFlatShaderProgram():
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -228,15 +229,15 @@ class SimpleTextureFlatShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
 
@@ -257,7 +258,7 @@ class SimpleTextureFlatShaderProgram():
         glBindVertexArray(0)
 
 
-class SimpleGouraudShaderProgram():
+class SimpleGouraudShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -336,9 +337,8 @@ class SimpleGouraudShaderProgram():
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -349,15 +349,15 @@ class SimpleGouraudShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
@@ -376,7 +376,7 @@ class SimpleGouraudShaderProgram():
         glBindVertexArray(0)
 
 
-class SimpleTextureGouraudShaderProgram():
+class SimpleTextureGouraudShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -462,9 +462,8 @@ class SimpleTextureGouraudShaderProgram():
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -475,15 +474,15 @@ class SimpleTextureGouraudShaderProgram():
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
 
@@ -504,7 +503,7 @@ class SimpleTextureGouraudShaderProgram():
         glBindVertexArray(0)
 
 
-class SimplePhongShaderProgram:
+class SimplePhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         vertex_shader = """
@@ -519,8 +518,13 @@ class SimplePhongShaderProgram:
             out vec3 fragNormal;
 
             uniform mat4 model;
-            uniform mat4 view;
-            uniform mat4 projection;
+
+            layout (std140, row_major) uniform Camera
+            {
+                mat4 view;
+                mat4 projection;
+                vec3 viewPosition;
+            };
 
             void main()
             {
@@ -541,18 +545,27 @@ class SimplePhongShaderProgram:
             in vec3 fragPosition;
             in vec3 fragOriginalColor;
             
-            uniform vec3 lightPosition; 
-            uniform vec3 viewPosition;
-            uniform vec3 La;
-            uniform vec3 Ld;
-            uniform vec3 Ls;
-            uniform vec3 Ka;
-            uniform vec3 Kd;
-            uniform vec3 Ks;
-            uniform uint shininess;
-            uniform float constantAttenuation;
-            uniform float linearAttenuation;
-            uniform float quadraticAttenuation;
+            layout (std140, row_major) uniform Camera
+            {
+                mat4 view;
+                mat4 projection;
+                vec3 viewPosition;
+            };
+
+            layout (std140) uniform Lighting
+            {
+                vec3 La;
+                vec3 Ld;
+                vec3 Ls;
+                vec3 Ka;
+                vec3 Kd;
+                vec3 Ks;
+                vec3 lightPosition;
+                uint shininess;
+                float constantAttenuation;
+                float linearAttenuation;
+                float quadraticAttenuation;
+            };
 
             void main()
             {
@@ -589,9 +602,9 @@ class SimplePhongShaderProgram:
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
+        bindUniformBlocks(self.shaderProgram)
 
 
     def setupVAO(self, gpuShape):
@@ -602,15 +615,15 @@ class SimplePhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
@@ -629,7 +642,7 @@ class SimplePhongShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTexturePhongShaderProgram:
+class SimpleTexturePhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         vertex_shader = """
@@ -644,8 +657,13 @@ class SimpleTexturePhongShaderProgram:
             out vec3 fragNormal;
 
             uniform mat4 model;
-            uniform mat4 view;
-            uniform mat4 projection;
+
+            layout (std140, row_major) uniform Camera
+            {
+                mat4 view;
+                mat4 projection;
+                vec3 viewPosition;
+            };
 
             void main()
             {
@@ -666,18 +684,27 @@ class SimpleTexturePhongShaderProgram:
 
             out vec4 fragColor;
             
-            uniform vec3 lightPosition; 
-            uniform vec3 viewPosition; 
-            uniform vec3 La;
-            uniform vec3 Ld;
-            uniform vec3 Ls;
-            uniform vec3 Ka;
-            uniform vec3 Kd;
-            uniform vec3 Ks;
-            uniform uint shininess;
-            uniform float constantAttenuation;
-            uniform float linearAttenuation;
-            uniform float quadraticAttenuation;
+            layout (std140, row_major) uniform Camera
+            {
+                mat4 view;
+                mat4 projection;
+                vec3 viewPosition;
+            };
+
+            layout (std140) uniform Lighting
+            {
+                vec3 La;
+                vec3 Ld;
+                vec3 Ls;
+                vec3 Ka;
+                vec3 Kd;
+                vec3 Ks;
+                vec3 lightPosition;
+                uint shininess;
+                float constantAttenuation;
+                float linearAttenuation;
+                float quadraticAttenuation;
+            };
 
             uniform sampler2D samplerTex;
 
@@ -718,9 +745,9 @@ class SimpleTexturePhongShaderProgram:
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
+        bindUniformBlocks(self.shaderProgram)
 
 
     def setupVAO(self, gpuShape, obj):
@@ -731,17 +758,17 @@ class SimpleTexturePhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         if obj=="obj": glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         else: glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         if obj=="obj": glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         else: glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         if obj=="obj": glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         else: glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
@@ -762,8 +789,163 @@ class SimpleTexturePhongShaderProgram:
         # Unbind the current VAO
         glBindVertexArray(0)
 
+class InstancedTexturePhongShaderProgram(UniformCacheMixin):
+    """SimpleTexturePhongShaderProgram with the model matrix as a per instance attribute"""
+
+    def __init__(self):
+        vertex_shader = """
+            #version 330 core
+            
+            in vec3 position;
+            in vec2 texCoords;
+            in vec3 normal;
+            in mat4 instanceModel;
+
+            out vec3 fragPosition;
+            out vec2 fragTexCoords;
+            out vec3 fragNormal;
+
+            layout (std140, row_major) uniform Camera
+            {
+                mat4 view;
+                mat4 projection;
+                vec3 viewPosition;
+            };
+
+            void main()
+            {
+                fragPosition = vec3(instanceModel * vec4(position, 1.0));
+                fragTexCoords = texCoords;
+                fragNormal = mat3(transpose(inverse(instanceModel))) * normal;  
+                
+                gl_Position = projection * view * vec4(fragPosition, 1.0);
+            }
+            """
+
+        fragment_shader = """
+            #version 330 core
+
+            in vec3 fragNormal;
+            in vec3 fragPosition;
+            in vec2 fragTexCoords;
+
+            out vec4 fragColor;
+            
+            layout (std140, row_major) uniform Camera
+            {
+                mat4 view;
+                mat4 projection;
+                vec3 viewPosition;
+            };
+
+            layout (std140) uniform Lighting
+            {
+                vec3 La;
+                vec3 Ld;
+                vec3 Ls;
+                vec3 Ka;
+                vec3 Kd;
+                vec3 Ks;
+                vec3 lightPosition;
+                uint shininess;
+                float constantAttenuation;
+                float linearAttenuation;
+                float quadraticAttenuation;
+            };
+
+            uniform sampler2D samplerTex;
+
+            void main()
+            {
+                // ambient
+                vec3 ambient = Ka * La;
+                
+                // diffuse
+                // fragment normal has been interpolated, so it does not necessarily have norm equal to 1
+                vec3 normalizedNormal = normalize(fragNormal);
+                vec3 toLight = lightPosition - fragPosition;
+                vec3 lightDir = normalize(toLight);
+                float diff = max(dot(normalizedNormal, lightDir), 0.0);
+                vec3 diffuse = Kd * Ld * diff;
+                
+                // specular
+                vec3 viewDir = normalize(viewPosition - fragPosition);
+                vec3 reflectDir = reflect(-lightDir, normalizedNormal);  
+                float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+                vec3 specular = Ks * Ls * spec;
+
+                // attenuation
+                float distToLight = length(toLight);
+                float attenuation = constantAttenuation
+                    + linearAttenuation * distToLight
+                    + quadraticAttenuation * distToLight * distToLight;
+                    
+                vec4 fragOriginalColor = texture(samplerTex, fragTexCoords);
+
+                vec3 result = (ambient + ((diffuse + specular) / attenuation)) * fragOriginalColor.rgb;
+                fragColor = vec4(result, 1.0);
+            }
+            """
+
+        # Binding artificial vertex array object for validation
+        VAO = glGenVertexArrays(1)
+        glBindVertexArray(VAO)
+
+
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
+        bindUniformBlocks(self.shaderProgram)
+
+
+    def setupVAO(self, gpuShape, obj):
+
+        glBindVertexArray(gpuShape.vao)
+
+        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
+
+        # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
+        position = self.attribLocation("position")
+        if obj=="obj": glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
+        else: glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(position)
+
+        color = self.attribLocation("texCoords")
+        if obj=="obj": glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
+        else: glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
+        glEnableVertexAttribArray(color)
+
+        normal = self.attribLocation("normal")
+        if obj=="obj": glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+        else: glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(20))
+        glEnableVertexAttribArray(normal)
+
+        # One model matrix per instance, a mat4 attribute takes 4 consecutive vec4 locations
+        glBindBuffer(GL_ARRAY_BUFFER, gpuShape.instanceVbo)
+        instanceModel = self.attribLocation("instanceModel")
+        for column in range(4):
+            glVertexAttribPointer(instanceModel + column, 4, GL_FLOAT, GL_FALSE, 64, ctypes.c_void_p(16 * column))
+            glEnableVertexAttribArray(instanceModel + column)
+            glVertexAttribDivisor(instanceModel + column, 1)
+
+        # Unbinding current vao
+        glBindVertexArray(0)
+
+
+    def drawCall(self, gpuShape, mode=GL_TRIANGLES):
+        assert isinstance(gpuShape, InstancedGPUShape)
+
+        # Binding the VAO and executing one draw call for every instance
+        glBindVertexArray(gpuShape.vao)
+        glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
+
+        glDrawElementsInstanced(mode, gpuShape.size, GL_UNSIGNED_INT, None, gpuShape.count)
+
+        # Unbind the current VAO
+        glBindVertexArray(0)
+
 #TAREA4: Se crea este nuevo shader para usar múltiples luces con texturas
-class MultipleLightTexturePhongShaderProgram:
+class MultipleLightTexturePhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         #TAREA4: Ahora los shaders están en archivos de texto independientes, se leen aquí
@@ -778,9 +960,8 @@ class MultipleLightTexturePhongShaderProgram:
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -791,15 +972,15 @@ class MultipleLightTexturePhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
         glEnableVertexAttribArray(normal)
 
@@ -820,7 +1001,7 @@ class MultipleLightTexturePhongShaderProgram:
         glBindVertexArray(0)
 
 #TAREA4: Se crea este shader para soportar geometría con color y múltiples luces
-class MultipleLightPhongShaderProgram:
+class MultipleLightPhongShaderProgram(UniformCacheMixin):
 
     def __init__(self):
         #TAREA4: Ahora los shaders están en archivos de texto independientes, aquí los leemos
@@ -835,9 +1016,8 @@ class MultipleLightPhongShaderProgram:
         glBindVertexArray(VAO)
 
 
-        self.shaderProgram = OpenGL.GL.shaders.compileProgram(
-            OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
-            OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.shaderProgram = compileProgram(vertex_shader, fragment_shader)
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -848,15 +1028,15 @@ class MultipleLightPhongShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
         
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(24))
         glEnableVertexAttribArray(normal)
 
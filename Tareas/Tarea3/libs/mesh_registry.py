@@ -0,0 +1,85 @@
+# coding=utf-8
+"""Process wide registry of GPU meshes, so each OBJ is parsed and uploaded once"""
+
+import os.path
+from OpenGL.GL import *
+
+from libs.gpu_shape import GPUShape, createGPUShape, sharedTextures
+from libs.obj_handler import read_OBJ_cached
+
+
+class SharedGPUShape(GPUShape):
+    """
+    A GPUShape that borrows the VAO, VBO and EBO of a registry mesh.
+    Only the texture belongs to it, so several objects can draw the same
+    mesh with different textures. clear() gives the mesh back to the registry.
+    """
+    def __init__(self, registry, key, mesh):
+        super().__init__()
+        self.registry = registry
+        self.key = key
+        self.vao = mesh.vao
+        self.vbo = mesh.vbo
+        self.ebo = mesh.ebo
+        self.size = mesh.size
+        self.layout = mesh.layout
+        self.aabbMin, self.aabbMax = mesh.aabbMin, mesh.aabbMax
+        self.center, self.radius = mesh.center, mesh.radius
+
+    def clear(self):
+        """Freeing the texture and the reference to the shared mesh"""
+
+        # Shared textures (e.g. of the texture manager) are freed by their owner
+        if self.texture != None and self.texture not in sharedTextures:
+            glDeleteTextures(1, [self.texture])
+            self.texture = None
+
+        if self.key != None:
+            self.registry.release(self.key)
+            self.key = None
+
+
+class MeshRegistry:
+    """
+    Reference counted GPU meshes keyed by (path, layout).
+    layout is the same value createGPUShape passes to pipeline.setupVAO, the
+    VAO is configured with the pipeline of the first acquire.
+    """
+    def __init__(self, loader=read_OBJ_cached):
+        self.loader = loader
+        self.meshes = {}
+        self.counts = {}
+
+    def acquire(self, pipeline, filename, layout="obj"):
+        key = (os.path.abspath(filename), layout)
+        if key not in self.meshes:
+            self.meshes[key] = createGPUShape(pipeline, self.loader(filename), layout)
+            self.counts[key] = 0
+        self.counts[key] += 1
+        return SharedGPUShape(self, key, self.meshes[key])
+
+    def release(self, key):
+        self.counts[key] -= 1
+        if self.counts[key] == 0:
+            self.meshes.pop(key).clear()
+            del self.counts[key]
+
+    def clear(self):
+        """Freeing GPU memory of every mesh, even if still referenced"""
+
+        for mesh in self.meshes.values():
+            mesh.clear()
+        self.meshes = {}
+        self.counts = {}
+
+
+_registry = MeshRegistry()
+
+
+def getRegistry():
+    return _registry
+
+
+def createSharedGPUShape(pipeline, filename, layout="obj"):
+    """Shortcut to acquire a mesh from the process registry, the texture is left to the caller"""
+    return _registry.acquire(pipeline, filename, layout)
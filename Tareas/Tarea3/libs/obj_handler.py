@@ -1,5 +1,9 @@
 from libs.basic_shapes import Shape as _Shape
 import numpy as np
+import hashlib
+import os.path
+import struct
+import re
 
 
 def read_face_vertex(face_description):
@@ -205,3 +209,201 @@ def read_OBJ2(filename):
             index += 3
 
     return _Shape(vertex_data, indices)
+
+
+# Bodies of the v/vt/vn/f lines, used by read_OBJ_numpy to tokenize a whole file at once
+_V_LINE = re.compile(r'^v (.*)$', re.MULTILINE)
+_VT_LINE = re.compile(r'^vt (.*)$', re.MULTILINE)
+_VN_LINE = re.compile(r'^vn (.*)$', re.MULTILINE)
+_F_LINE = re.compile(r'^f (.*)$', re.MULTILINE)
+
+
+def _fan_corners(counts):
+    """Corner indices of the fan triangulation used by read_OBJ2.
+
+    A face with n corners c0..c(n-1) is split into (c0, c1, c2) and then
+    (ck, ck+1, c0) for k = 2..n-2, exactly as the per-line loaders do.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    trisPerFace = counts - 2
+    faceOfTri = np.repeat(np.arange(len(counts)), trisPerFace)
+    firstTri = np.concatenate(([0], np.cumsum(trisPerFace)[:-1]))
+    j = np.arange(len(faceOfTri)) - firstTri[faceOfTri]
+
+    base = offsets[faceOfTri]
+    corners = np.empty((len(faceOfTri), 3), dtype=np.int64)
+    corners[:, 0] = np.where(j == 0, base, base + j + 1)
+    corners[:, 1] = np.where(j == 0, base + 1, base + j + 2)
+    corners[:, 2] = np.where(j == 0, base + 2, base)
+    return corners.reshape(-1)
+
+
+def _dedup_corners(corners, sizes):
+    """Merges repeated (v, vt, vn) triples into a single vertex.
+
+    Each triple is packed into one integer key, the unique keys become the
+    vertices (in order of first appearance) and every corner is replaced
+    by the index of its key.
+    """
+    keys = (corners[:, 0] * sizes[1] + corners[:, 1]) * sizes[2] + corners[:, 2]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    return corners[first[order]], rank[inverse.reshape(-1)].astype(np.uint32)
+
+
+def read_OBJ_numpy(filename, dedup=False):
+    """Vectorized version of read_OBJ2.
+
+    The file is tokenized in bulk and the v/vt/vn/f blocks are converted
+    straight to numpy arrays. The interleaved buffer (pos3, uv2, normal3)
+    is built with fancy indexing, so vertices is a float32 array and
+    indices an uint32 array with the same contents read_OBJ2 would give.
+
+    With dedup=True every distinct (v, vt, vn) triple is stored only once
+    and the indices reference the shared vertices.
+    """
+
+    with open(filename, 'r') as file:
+        text = file.read()
+
+    vLines = _V_LINE.findall(text)
+    vtLines = _VT_LINE.findall(text)
+    vnLines = _VN_LINE.findall(text)
+    fLines = _F_LINE.findall(text)
+
+    vertices = np.fromstring(' '.join(vLines), dtype=np.float32, sep=' ').reshape(-1, 3)
+    tex_coords = np.fromstring(' '.join(vtLines), dtype=np.float32, sep=' ')
+    assert len(tex_coords) == 2 * len(vtLines), "Texture coordinates with different than 2 dimensions are not supported"
+    tex_coords = tex_coords.reshape(-1, 2)
+    normals = np.fromstring(' '.join(vnLines), dtype=np.float32, sep=' ').reshape(-1, 3)
+
+    # Every corner is "v/vt/vn", so a face with n corners has 2n slashes
+    counts = np.array([line.count('/') for line in fLines], dtype=np.int64) // 2
+    faceData = np.fromstring(' '.join(fLines).replace('/', ' '), dtype=np.int64, sep=' ')
+    assert len(faceData) == 3 * counts.sum(), "Only faces where its vertices require 3 indices are defined."
+    faceData = faceData.reshape(-1, 3) - 1
+
+    corners = faceData[_fan_corners(counts)]
+
+    if dedup:
+        corners, indices = _dedup_corners(corners, (len(vertices), len(tex_coords), len(normals)))
+    else:
+        indices = np.arange(len(corners), dtype=np.uint32)
+
+    vertex_data = np.empty((len(corners), 8), dtype=np.float32)
+    vertex_data[:, 0:3] = vertices[corners[:, 0]]
+    vertex_data[:, 3:5] = tex_coords[corners[:, 1]]
+    vertex_data[:, 5:8] = normals[corners[:, 2]]
+
+    return _Shape(vertex_data.reshape(-1), indices)
+
+
+# Compiled mesh cache: a 64 bytes header followed by the raw float32 vertex block
+# and the uint32 index block, the same types GPUShape.fillBuffers uploads
+MESHBIN_MAGIC = b"MESHBIN1"
+MESHBIN_VERSION = 2
+_MESHBIN_HEADER = struct.Struct("<8sIIqq20sIII")
+
+
+def _sourceKey(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _sourceHash(filename):
+    with open(filename, 'rb') as file:
+        return hashlib.sha1(file.read()).digest()
+
+
+def meshbinPath(filename, cacheDir=None):
+    """Path of the compiled cache of an OBJ file, next to it unless cacheDir is given."""
+    if cacheDir is None:
+        return filename + ".meshbin"
+    return os.path.join(cacheDir, os.path.basename(filename) + ".meshbin")
+
+
+def write_meshbin(path, shape, sourceFilename, dedup):
+    vertices = np.ascontiguousarray(shape.vertices, dtype=np.float32)
+    indices = np.ascontiguousarray(shape.indices, dtype=np.uint32)
+
+    mtime, size = _sourceKey(sourceFilename)
+    header = _MESHBIN_HEADER.pack(MESHBIN_MAGIC, MESHBIN_VERSION, int(dedup), mtime, size,
+        _sourceHash(sourceFilename), len(vertices), len(indices), indices.itemsize)
+
+    # Written to a temporary file first so a crash never leaves a broken cache behind
+    tmpPath = path + ".tmp"
+    with open(tmpPath, 'wb') as file:
+        file.write(header)
+        vertices.tofile(file)
+        indices.tofile(file)
+    os.replace(tmpPath, path)
+
+
+def read_meshbin(path, sourceFilename=None, dedup=None):
+    """Loads a compiled mesh with no parsing at all.
+
+    Returns None if the file is not a valid cache, was compiled with a
+    different dedup mode or no longer matches sourceFilename. The source
+    is considered unchanged when its mtime and size match; otherwise its
+    hash is compared so a touched but identical file is still a hit.
+    """
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(_MESHBIN_HEADER.size)
+    except OSError:
+        return None
+
+    if len(header) != _MESHBIN_HEADER.size:
+        return None
+    magic, version, flags, mtime, size, digest, vertexCount, indexCount, indexSize = _MESHBIN_HEADER.unpack(header)
+    if magic != MESHBIN_MAGIC or version != MESHBIN_VERSION or indexSize != 4:
+        return None
+    if dedup is not None and flags != int(dedup):
+        return None
+    if sourceFilename is not None and _sourceKey(sourceFilename) != (mtime, size):
+        if _sourceHash(sourceFilename) != digest:
+            return None
+        # Same contents, only the mtime changed: refresh the key to skip hashing next time
+        try:
+            newMtime, newSize = _sourceKey(sourceFilename)
+            with open(path, 'r+b') as file:
+                file.write(_MESHBIN_HEADER.pack(magic, version, flags, newMtime, newSize,
+                    digest, vertexCount, indexCount, indexSize))
+        except OSError:
+            pass
+
+    vertices = np.fromfile(path, dtype=np.float32, count=vertexCount, offset=_MESHBIN_HEADER.size)
+    indices = np.fromfile(path, dtype=np.uint32, count=indexCount, offset=_MESHBIN_HEADER.size + vertices.nbytes)
+    if len(vertices) != vertexCount or len(indices) != indexCount:
+        return None
+
+    return _Shape(vertices, indices)
+
+
+def read_OBJ_cached(filename, dedup=True, cacheDir=None):
+    """Same result as read_OBJ_numpy, but compiled once to a .meshbin file.
+
+    Later calls load the cache directly while the OBJ is unchanged. If the
+    cache cannot be written (read only assets, for instance) the parsed
+    shape is returned anyway.
+    """
+    path = meshbinPath(filename, cacheDir)
+
+    shape = read_meshbin(path, filename, dedup)
+    if shape is not None:
+        return shape
+
+    shape = read_OBJ_numpy(filename, dedup)
+    try:
+        if cacheDir is not None:
+            os.makedirs(cacheDir, exist_ok=True)
+        write_meshbin(path, shape, filename, dedup)
+    except OSError:
+        pass
+    return shape
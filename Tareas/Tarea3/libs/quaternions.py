@@ -0,0 +1,187 @@
+# coding=utf-8
+"""Unit quaternions for rotations, stored as (w, x, y, z) arrays.
+Every function also takes stacks of shape (...,4), one quaternion per row.
+Functions with an out parameter write their result there, for a single
+quaternion that creates no arrays at all."""
+
+import math
+import numpy as np
+
+_ZERO = np.zeros(3)
+_ONE = np.ones(3)
+
+
+def identity():
+    return np.array([1.0, 0.0, 0.0, 0.0])
+
+
+def normalize(q):
+    q = np.asarray(q, dtype=np.float64)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def conjugate(q):
+    return np.asarray(q, dtype=np.float64) * [1, -1, -1, -1]
+
+
+def fromAxisAngle(axis, theta):
+    axis = np.asarray(axis, dtype=np.float64)
+    axis = axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+    half = np.asarray(theta, dtype=np.float64)[..., None] * 0.5
+    return np.concatenate([np.cos(half), np.sin(half) * axis], axis=-1)
+
+
+def fromEuler(rx, ry, rz, out=None):
+    """Same rotation as tr.rotationZ(rz) * tr.rotationY(ry) * tr.rotationX(rx),
+    the product qz * qy * qx written out"""
+    cx, sx = np.cos(np.multiply(rx, 0.5)), np.sin(np.multiply(rx, 0.5))
+    cy, sy = np.cos(np.multiply(ry, 0.5)), np.sin(np.multiply(ry, 0.5))
+    cz, sz = np.cos(np.multiply(rz, 0.5)), np.sin(np.multiply(rz, 0.5))
+    if out is None:
+        out = np.empty(np.broadcast_shapes(np.shape(cx), np.shape(cy), np.shape(cz)) + (4,))
+    out[..., 0] = cz*cy*cx + sz*sy*sx
+    out[..., 1] = cz*cy*sx - sz*sy*cx
+    out[..., 2] = cz*sy*cx + sz*cy*sx
+    out[..., 3] = sz*cy*cx - cz*sy*sx
+    return out
+
+
+def multiply(q, r, out=None):
+    """Composition: rotating by multiply(q, r) rotates by r first, then by q"""
+    q, r = np.asarray(q, dtype=np.float64), np.asarray(r, dtype=np.float64)
+    w1, x1, y1, z1 = np.moveaxis(q, -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(r, -1, 0)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(q.shape, r.shape))
+    # All four are computed before writing, out may be q or r
+    out[..., 0], out[..., 1], out[..., 2], out[..., 3] = (
+        w1*w2 - x1*x2 - y1*y2 - z1*z2,
+        w1*x2 + x1*w2 + y1*z2 - z1*y2,
+        w1*y2 - x1*z2 + y1*w2 + z1*x2,
+        w1*z2 + x1*y2 - y1*x2 + z1*w2)
+    return out
+
+
+def accumulate(start, turns):
+    """(n+1,4) running products: start, then each one turned by the next of the
+    (n,4) turns, i.e. q[i+1] = multiply(turns[i], q[i]). Done on python floats
+    since every step depends on the previous one."""
+    result = np.empty((len(turns) + 1, 4))
+    result[0] = start
+    w1, x1, y1, z1 = result[0]
+    for i, (w2, x2, y2, z2) in enumerate(np.asarray(turns, dtype=np.float64).tolist(), 1):
+        w1, x1, y1, z1 = (
+            w2*w1 - x2*x1 - y2*y1 - z2*z1,
+            w2*x1 + x2*w1 + y2*z1 - z2*y1,
+            w2*y1 - x2*z1 + y2*w1 + z2*x1,
+            w2*z1 + x2*y1 - y2*x1 + z2*w1)
+        result[i] = w1, x1, y1, z1
+    return normalize(result)
+
+
+def rotate(q, v):
+    """Rotates the (...,3) vectors v"""
+    q, v = np.asarray(q, dtype=np.float64), np.asarray(v, dtype=np.float64)
+    w, u = q[..., 0:1], q[..., 1:4]
+    t = 2 * np.cross(u, v)
+    return v + w * t + np.cross(u, t)
+
+
+def fromTo(u, v):
+    """Shortest arc rotation taking the direction u to the direction v.
+    Unlike angles recovered with arcsin/arccos it is continuous for any pair
+    of directions; opposite ones turn half around an axis perpendicular to u."""
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    u = u / np.linalg.norm(u, axis=-1, keepdims=True)
+    v = v / np.linalg.norm(v, axis=-1, keepdims=True)
+    dot = np.sum(u * v, axis=-1, keepdims=True)
+    q = np.concatenate([1 + dot, np.cross(u, v)], axis=-1)
+
+    # Opposite directions, any perpendicular axis works
+    opposite = dot[..., 0] < -1 + 1e-9
+    if np.any(opposite):
+        other = np.where(np.abs(u[..., 0:1]) < 0.9, [1.0, 0, 0], [0, 1.0, 0])
+        q[opposite] = np.concatenate([np.zeros_like(dot), np.cross(u, other)], axis=-1)[opposite]
+    return normalize(q)
+
+
+def slerp(q0, q1, t, out=None):
+    """Constant speed interpolation from q0 (t = 0) to q1 (t = 1) along the shortest path"""
+    if out is not None and np.ndim(q0) == 1 and np.ndim(q1) == 1 and np.isscalar(t):
+        return _slerp(q0, q1, float(t), out)
+    q0, q1 = normalize(q0), normalize(q1)
+    t = np.asarray(t, dtype=np.float64)[..., None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+
+    # q and -q are the same rotation, take the closest one
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+
+    # Almost the same rotation, a normalized lerp avoids dividing by sin(0)
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin_theta = np.sin(theta)
+    close = sin_theta < 1e-6
+    safe = np.where(close, 1, sin_theta)
+    a = np.where(close, 1 - t, np.sin((1 - t) * theta) / safe)
+    b = np.where(close, t, np.sin(t * theta) / safe)
+    result = normalize(a * q0 + b * q1)
+    if out is not None:
+        out[...] = result
+        return out
+    return result
+
+
+def _slerp(q0, q1, t, out):
+    """slerp of two quaternions on python floats"""
+    n0, n1 = math.sqrt(sum(v*v for v in q0)), math.sqrt(sum(v*v for v in q1))
+    q0, q1 = [float(v) / n0 for v in q0], [float(v) / n1 for v in q1]
+    dot = sum(a*b for a, b in zip(q0, q1))
+    if dot < 0:
+        q1, dot = [-v for v in q1], -dot
+
+    theta = math.acos(min(dot, 1.0))
+    sin_theta = math.sin(theta)
+    if sin_theta < 1e-6:
+        a, b = 1 - t, t
+    else:
+        a, b = math.sin((1 - t) * theta) / sin_theta, math.sin(t * theta) / sin_theta
+    result = [a*v0 + b*v1 for v0, v1 in zip(q0, q1)]
+    norm = math.sqrt(sum(v*v for v in result))
+    for i in range(4):
+        out[i] = result[i] / norm
+    return out
+
+
+def toMatrix(q, out=None):
+    """4x4 rotation matrix, or a (...,4,4) stack, written into out if given"""
+    return toTRS(_ZERO, q, _ONE, out)
+
+
+def toTRS(translation, q, scaling, out=None):
+    """translate(t) * rotation(q) * scale(s), the quaternion version of tr.trs.
+    translation and scaling are (...,3) and broadcast against q."""
+    q = np.asarray(q, dtype=np.float64)
+    translation = np.asarray(translation, dtype=np.float64)
+    scaling = np.asarray(scaling, dtype=np.float64)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    if out is None:
+        shape = np.broadcast_shapes(w.shape, translation.shape[:-1], scaling.shape[:-1])
+        out = np.empty(shape + (4, 4), dtype=np.float32)
+
+    # 2/|q|^2 in place of 2 normalizes q along the way
+    s = 2 / (w*w + x*x + y*y + z*z)
+    out[..., 0, 0] = 1 - s*(y*y + z*z)
+    out[..., 0, 1] = s*(x*y - w*z)
+    out[..., 0, 2] = s*(x*z + w*y)
+    out[..., 1, 0] = s*(x*y + w*z)
+    out[..., 1, 1] = 1 - s*(x*x + z*z)
+    out[..., 1, 2] = s*(y*z - w*x)
+    out[..., 2, 0] = s*(x*z - w*y)
+    out[..., 2, 1] = s*(y*z + w*x)
+    out[..., 2, 2] = 1 - s*(x*x + y*y)
+    out[..., 0:3, 0:3] *= scaling[..., None, :]
+    out[..., 0:3, 3] = translation
+    out[..., 3, 0:3] = 0
+    out[..., 3, 3] = 1
+    return out
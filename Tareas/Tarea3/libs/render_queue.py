@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Render queue that sorts draw calls by program, texture and VAO"""
+
+from itertools import groupby
+from OpenGL.GL import *
+
+from libs.gpu_shape import InstancedGPUShape
+
+
+class RenderQueue:
+    """
+    Collects (pipeline, GPUShape, model matrix) items during a frame and
+    draws them sorted by state key, so consecutive items sharing the
+    program, texture or VAO do not bind them again. stats keeps the binds
+    issued in the last flush next to the ones a naive drawCall per item
+    would have issued.
+    With an instancedPipeline, every group of at least minInstances items
+    sharing mesh and texture is merged into a single instanced draw call.
+    """
+    def __init__(self, transformName="model", instancedPipeline=None, minInstances=2):
+        self.transformName = transformName
+        self.instancedPipeline = instancedPipeline
+        self.minInstances = minInstances
+        self.batches = {} # (vao, texture) -> InstancedGPUShape
+        self.items = []
+        self.stats = {}
+
+    def submit(self, pipeline, gpuShape, model):
+        self.items += [(pipeline, gpuShape, model)]
+
+    @staticmethod
+    def stateKey(item):
+        pipeline, gpuShape, _ = item
+        texture = gpuShape.texture if gpuShape.texture != None else 0
+        return (int(pipeline.shaderProgram), int(texture), int(gpuShape.vao))
+
+    def batch(self, gpuShape):
+        key = (int(gpuShape.vao), gpuShape.texture)
+        if key not in self.batches:
+            batch = InstancedGPUShape(gpuShape)
+            self.instancedPipeline.setupVAO(batch, batch.layout)
+            self.batches[key] = batch
+        return self.batches[key]
+
+    def flush(self, mode=GL_TRIANGLES):
+        self.items.sort(key=RenderQueue.stateKey)
+
+        programs = textures = vaos = draws = instanced = 0
+        current = (None, None, None)
+        for key, group in groupby(self.items, key=RenderQueue.stateKey):
+            group = list(group)
+            pipeline, gpuShape, _ = group[0]
+
+            if self.instancedPipeline is not None and len(group) >= self.minInstances:
+                batch = self.batch(gpuShape)
+                batch.fillInstances([model for _, _, model in group])
+                if current[0] != int(self.instancedPipeline.shaderProgram):
+                    glUseProgram(self.instancedPipeline.shaderProgram)
+                    programs += 1
+                self.instancedPipeline.drawCall(batch, mode)
+                current = (int(self.instancedPipeline.shaderProgram), None, None)
+                textures += 1
+                vaos += 1
+                draws += 1
+                instanced += len(group)
+                continue
+
+            program, texture, vao = key
+            if program != current[0]:
+                glUseProgram(pipeline.shaderProgram)
+                programs += 1
+            if texture != current[1] and gpuShape.texture != None:
+                glBindTexture(GL_TEXTURE_2D, gpuShape.texture)
+                textures += 1
+            if vao != current[2]:
+                glBindVertexArray(gpuShape.vao)
+                vaos += 1
+            current = (program, texture, vao)
+
+            for _, _, model in group:
+                pipeline.set_mat4(self.transformName, model)
+                glDrawElements(mode, gpuShape.size, GL_UNSIGNED_INT, None)
+                draws += 1
+
+        # Unbind the current VAO, as drawCall does
+        glBindVertexArray(0)
+
+        items = len(self.items)
+        texturedItems = sum(1 for _, gpuShape, _ in self.items if gpuShape.texture != None)
+        self.stats = {
+            "items": items,
+            "draws": draws,
+            "instancedItems": instanced,
+            "programBinds": programs,
+            "textureBinds": textures,
+            "vaoBinds": vaos,
+            "savedBinds": items + texturedItems - textures - vaos,
+        }
+        self.items = []
+        return self.stats
+
+    def clear(self):
+        """Freeing the instance buffers"""
+
+        for batch in self.batches.values():
+            batch.clear()
+        self.batches = {}
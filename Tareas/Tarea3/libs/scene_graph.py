@@ -5,102 +5,544 @@ from OpenGL.GL import *
 import OpenGL.GL.shaders
 import numpy as np
 import libs.transformations as tr
+import libs.quaternions as qt
 import libs.gpu_shape as gs
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
 
+IDENTITY_ROTATION = (1.0, 0.0, 0.0, 0.0)
+
+# Fewer pending setTRS nodes than this are built one by one, the batched
+# build only pays off for many of them
+TRS_BATCH = 8
+
+
+class ChildList(list):
+    """
+    List of childs that keeps the parent links and the name index of the
+    tree current when nodes are added or removed (append, +=, remove, ...).
+    """
+    def __init__(self, owner, childs=()):
+        super().__init__()
+        self.owner = owner
+        self.extend(childs)
+
+    def _attach(self, childs):
+        childs = list(childs)
+        for child in childs:
+            if isinstance(child, SceneGraphNode):
+                self.owner._attach(child)
+        return childs
+
+    def _detach(self, childs):
+        for child in childs:
+            if isinstance(child, SceneGraphNode):
+                self.owner._detach(child)
+
+    def append(self, child):
+        super().append(self._attach([child])[0])
+
+    def extend(self, childs):
+        super().extend(self._attach(childs))
+
+    def __iadd__(self, childs):
+        self.extend(childs)
+        return self
+
+    def insert(self, position, child):
+        super().insert(position, self._attach([child])[0])
+
+    def remove(self, child):
+        super().remove(child)
+        self._detach([child])
+
+    def pop(self, position=-1):
+        child = super().pop(position)
+        self._detach([child])
+        return child
+
+    def clear(self):
+        childs = list(self)
+        super().clear()
+        self._detach(childs)
+
+    def __setitem__(self, key, value):
+        old = self[key] if isinstance(key, slice) else [self[key]]
+        new = value if isinstance(key, slice) else [value]
+        super().__setitem__(key, value)
+        self._detach(old)
+        self._attach(new)
+
+    def __delitem__(self, key):
+        old = self[key] if isinstance(key, slice) else [self[key]]
+        super().__delitem__(key)
+        self._detach(old)
+
 
 class SceneGraphNode:
     """
     A simple class to handle a scene graph
     Each node represents a group of objects
     Each leaf represents a basic figure (GPUShape)
-    To identify each node properly, it MUST have a unique name
+    To identify each node properly, it MUST have a unique name, adding a
+    node whose name already exists in the tree raises ValueError
+    Every node has a single parent and all nodes of a tree share a
+    name -> node index, so lookups by name take constant time.
+    The world matrix (parent world times transform) is cached, assigning
+    transform marks the node and its descendants as dirty so only those
+    are recomputed. Each node owns its transform and world buffers:
+    assigning transform copies into the buffer, and it can also be written
+    in place (e.g. tr.translate(x, y, z, out=node.transform)) followed by
+    markDirty, which allocates nothing.
+    The transform can also be given as translation, rotation quaternion and
+    scaling with setTRS, the matrix is then built only when it is needed.
     """
     def __init__(self, name):
         self.name = name
-        self.transform = tr.identity()
+        self.parent = None
+        self.index = {name: self}
+        self.world = tr.identity()
+        self._transform = tr.identity()
+        self.trs = None # (translation, rotation, scaling) of setTRS
+        self.trsPending = False # trs not yet turned into the transform matrix
+        self.dirty = True
+        self.renderList = None # set by RenderList.compile
+        self.slot = None
         self.childs = []
 
+    @property
+    def childs(self):
+        return self._childs
+
+    @childs.setter
+    def childs(self, childs):
+        # node.childs += [...] assigns the same list back
+        if hasattr(self, "_childs") and childs is self._childs:
+            return
+        if hasattr(self, "_childs"):
+            self._childs.clear()
+        self._childs = ChildList(self, childs)
+
+    @property
+    def transform(self):
+        if self.trsPending:
+            self.buildTransform()
+        return self._transform
+
+    @transform.setter
+    def transform(self, transform):
+        # Once compiled the buffer is a view of renderList.local
+        self.trs, self.trsPending = None, False
+        self._transform[...] = transform
+        self.markDirty()
+
+    def setTRS(self, translation=(0, 0, 0), rotation=None, scaling=(1, 1, 1)):
+        """Transform as translate * rotation quaternion * scale. Compiled nodes
+        are built by RenderList.update, others when read."""
+        if self.trs is None:
+            self.trs = (np.zeros(3), qt.identity(), np.ones(3))
+        # Copied element by element into the buffers, without converting to arrays
+        t, q, s = self.trs
+        t[0], t[1], t[2] = translation
+        q[0], q[1], q[2], q[3] = IDENTITY_ROTATION if rotation is None else rotation
+        s[0], s[1], s[2] = scaling
+        if not self.trsPending:
+            self.trsPending = True
+            if self.renderList is not None:
+                self.renderList.pending += [self]
+        self.markDirty()
+
+    def buildTransform(self):
+        qt.toTRS(*self.trs, out=self._transform)
+        self.trsPending = False
+
+    def markDirty(self):
+        # A dirty node always has dirty descendants, so the walk can stop there
+        self.dirty = True
+        for child in self.childs:
+            if isinstance(child, SceneGraphNode) and not child.dirty:
+                child.markDirty()
+
+    def nodes(self):
+        """This node and every SceneGraphNode below it"""
+        found = [self]
+        for child in self.childs:
+            if isinstance(child, SceneGraphNode):
+                found += child.nodes()
+        return found
+
+    def _attach(self, child):
+        if child.parent is not None:
+            raise ValueError(f"Node '{child.name}' already has parent '{child.parent.name}'")
+        subtree = child.nodes()
+        for node in subtree:
+            if node.name in self.index:
+                raise ValueError(f"There is already a node named '{node.name}' in the scene graph")
+        for node in subtree:
+            self.index[node.name] = node
+            node.index = self.index
+        child.parent = self
+        child.markDirty()
+        self.invalidateRenderList()
+
+    def _detach(self, child):
+        # The removed subtree becomes a tree of its own, with its own index
+        subtree = child.nodes()
+        index = {}
+        for node in subtree:
+            del self.index[node.name]
+            index[node.name] = node
+            node.index = index
+        child.parent = None
+        child.markDirty()
+        self.invalidateRenderList()
+
+    def invalidateRenderList(self):
+        # The structure changed, the render list is compiled again before its next draw
+        if self.renderList is not None:
+            self.renderList.valid = False
+
+    def isDescendantOf(self, node):
+        ancestor = self
+        while ancestor is not None:
+            if ancestor is node:
+                return True
+            ancestor = ancestor.parent
+        return False
+
     def clear(self):
         """Freeing GPU memory"""
 
         for child in self.childs:
             child.clear()
 
-            
 
-    
 def findNode(node, name):
 
     # The name was not found in this path
     if isinstance(node, gs.GPUShape):
         return None
 
-    # This is the requested node
-    if node.name == name:
-        return node
-    
-    # All childs are checked for the requested name
-    for child in node.childs:
-        foundNode = findNode(child, name)
-        if foundNode != None:
-            return foundNode
+    # Constant time lookup in the index shared by the whole tree,
+    # the node must still be below the one where the search starts
+    foundNode = node.index.get(name)
+    if foundNode is not None and foundNode.isDescendantOf(node):
+        return foundNode
 
     # No child of this node had the requested name
     return None
 
 
-def findTransform(node, name, parentTransform=tr.identity()):
+def worldTransform(node):
+    """Cached world matrix of node, relative to the root of its tree.
+    It is recomputed only if the node is dirty, from its parent link."""
+    if node.dirty:
+        if node.parent is not None:
+            np.matmul(worldTransform(node.parent), node.transform, out=node.world)
+        else:
+            node.world[...] = node.transform
+        node.dirty = False
+    return node.world
 
-    # The name was not found in this path
-    if isinstance(node, gs.GPUShape):
-        return None
-
-    newTransform = np.matmul(parentTransform, node.transform)
 
-    # This is the requested node
-    if node.name == name:
-        return newTransform
-    
-    # All childs are checked for the requested name
+def updateTransforms(node):
+    """Single pass that recomputes the world matrix of every dirty node"""
+    worldTransform(node)
     for child in node.childs:
-        foundTransform = findTransform(child, name, newTransform)
-        if isinstance(foundTransform, (np.ndarray, np.generic) ):
-            return foundTransform
+        if isinstance(child, SceneGraphNode):
+            updateTransforms(child)
 
-    # No child of this node had the requested name
-    return None
 
+# Default parentTransform, the cached matrices are used as they are
+IDENTITY = tr.identity()
 
-def findPosition(node, name, parentTransform=tr.identity()):
-    foundTransform = findTransform(node, name, parentTransform)
+# Matrices composed on the way from a node up to the start of a search
+_path = [tr.identity(), tr.identity()]
 
-    if isinstance(foundTransform, (np.ndarray, np.generic) ):
-        zero = np.array([[0,0,0,1]], dtype=np.float32).T
-        foundPosition = np.matmul(foundTransform, zero)
-        return foundPosition
+def _relativeTransform(node, start, parentTransform):
+    """parentTransform times the transforms from start down to node, both
+    included, as a traversal from start composes them. From the root of the
+    tree that is the cached world matrix, below it the path is composed in
+    scratch buffers. The result is only valid until the next call."""
+    free = 0
+    if start.parent is None:
+        transform = worldTransform(node)
+    else:
+        transform, ancestor = node.transform, node
+        while ancestor is not start:
+            ancestor = ancestor.parent
+            transform = np.matmul(ancestor.transform, transform, out=_path[free])
+            free = 1 - free
+    if parentTransform is IDENTITY:
+        return transform
+    return np.matmul(parentTransform, transform, out=_path[free])
 
-    return None
 
+def findTransform(node, name, parentTransform=IDENTITY):
+    """Transform of the named node relative to node, times parentTransform"""
 
-def drawSceneGraphNode(node, pipeline, transformName, parentTransform=tr.identity()):
-    assert(isinstance(node, SceneGraphNode))
+    foundNode = findNode(node, name)
+
+    # The name was not found below this node
+    if foundNode is None:
+        return None
+
+    return _relativeTransform(foundNode, node, parentTransform).copy()
+
+
+def findPosition(node, name, parentTransform=IDENTITY, out=None):
+    """Position of the named node relative to node (see findTransform) as a
+    (4,1) column, written into out if given"""
+    foundNode = findNode(node, name)
+    if foundNode is None:
+        return None
+    foundTransform = _relativeTransform(foundNode, node, parentTransform)
+
+    if out is not None:
+        # The matrix times (0,0,0,1) is its last column
+        out[:, 0] = foundTransform[:, 3]
+        return out
+    zero = np.array([[0,0,0,1]], dtype=np.float32).T
+    foundPosition = np.matmul(foundTransform, zero)
+    return foundPosition
 
-    # Composing the transformations through this path
-    newTransform = np.matmul(parentTransform, node.transform)
+
+def drawSceneGraphNode(node, pipeline, transformName, parentTransform=IDENTITY):
+    _drawSubtree(node, node, pipeline, transformName, parentTransform)
+
+
+def _drawSubtree(node, start, pipeline, transformName, parentTransform):
+    assert(isinstance(node, SceneGraphNode))
 
     # If the child node is a leaf, it should be a GPUShape.
-    # Hence, it can be drawn with drawCall
+    # Hence, it can be drawn with drawCall, composing the transformations
+    # from start, with the cached world matrices when start is the root
     if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape):
         leaf = node.childs[0]
-        glUniformMatrix4fv(glGetUniformLocation(pipeline.shaderProgram, transformName), 1, GL_TRUE, newTransform)
+        pipeline.set_mat4(transformName, _relativeTransform(node, start, parentTransform))
         pipeline.drawCall(leaf)
 
     # If the child node is not a leaf, it MUST be a SceneGraphNode,
-    # so this draw function is called recursively
+    # so this function is called recursively
     else:
         for child in node.childs:
-            drawSceneGraphNode(child, pipeline, transformName, newTransform)
+            _drawSubtree(child, start, pipeline, transformName, parentTransform)
+
+
+
+class RenderList:
+    """
+    The scene graph flattened into parallel arrays: parent index, a
+    (N,4,4) stack of local transforms and a table of leaves (node index,
+    GPUShape). World matrices are computed level by level with one batched
+    matmul per depth, so the per frame cost does not grow with a python
+    walk over every node. After compiling, node transforms are views of the
+    stack, and changing childs makes draw compile the list again. Slots
+    change with every compile, version counts them so whatever keeps slot
+    numbers (e.g. a SceneBVH) knows when to build them again.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.nodes = []
+        self.version = -1
+        self.compile()
+
+    def compile(self):
+        for node in self.nodes:
+            node.renderList, node.slot = None, None
+
+        # Breadth first, so every level is a contiguous block after its parents
+        nodes, parents, depths = [self.root], [-1], [0]
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            if not (len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape)):
+                for child in node.childs:
+                    assert(isinstance(child, SceneGraphNode))
+                    nodes += [child]
+                    parents += [i]
+                    depths += [depths[i] + 1]
+            i += 1
+
+        self.nodes = nodes
+        self.parents = np.array(parents, dtype=np.int64)
+        depths = np.array(depths, dtype=np.int64)
+        self.levels = [np.flatnonzero(depths == depth) for depth in range(depths.max() + 1)]
+        self.levelSlices = [slice(level[0], level[-1] + 1) for level in self.levels]
+        self.local = np.stack([node.transform for node in nodes]).astype(np.float32)
+        self.world = np.empty_like(self.local)
+        self.leaves = [(slot, node.childs[0]) for slot, node in enumerate(nodes)
+            if len(node.childs) == 1 and isinstance(node.childs[0], gs.GPUShape)]
+
+        # Local bounds of the leaves, as the 8 corners of their boxes
+        self.leafSlots = np.array([slot for slot, _ in self.leaves], dtype=np.int64)
+        bounded = [leaf.aabbMin is not None for _, leaf in self.leaves]
+        self.leafBounded = np.array(bounded, dtype=bool)
+        self.leafUnbounded = ~self.leafBounded
+        self.unboundedLeaves = np.flatnonzero(self.leafUnbounded)
+        corners = np.zeros((len(self.leaves), 8, 4), dtype=np.float32)
+        corners[:, :, 3] = 1
+        for i, (_, leaf) in enumerate(self.leaves):
+            if bounded[i]:
+                box = np.array([leaf.aabbMin, leaf.aabbMax])
+                corners[i, :, 0:3] = [[box[x][0], box[y][1], box[z][2]] for x in (0, 1) for y in (0, 1) for z in (0, 1)]
+        self.leafCorners = corners
+        self.aabbMin = np.full((len(nodes), 3), np.inf, dtype=np.float32)
+        self.aabbMax = np.full((len(nodes), 3), -np.inf, dtype=np.float32)
+        self.parentSlots = np.maximum(self.parents, 0)
+        self.allSlots = np.arange(len(nodes))
+        self.buffers = {}
+        self.stats = {}
+
+        # From now on the nodes write their transforms straight into the stack
+        for slot, node in enumerate(nodes):
+            node.renderList, node.slot, node._transform = self, slot, self.local[slot]
+        self.pending = [] # setTRS nodes to build, the stack above read (and built) the rest
+        self.valid = True
+        self.version += 1
+
+    def scratch(self, name, shape, dtype=np.float32):
+        """Array kept from frame to frame, created again only when its shape changes"""
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def update(self, parentTransform=tr.identity()):
+        """World matrices of every node, one batched matmul per level.
+        Levels are contiguous, so each one is written in place."""
+        if not self.valid:
+            self.compile()
+        self.buildPending()
+        np.matmul(parentTransform, self.local[0], out=self.world[0])
+        parentWorld = self.scratch("parentWorld", self.world.shape)
+        for level in self.levelSlices[1:]:
+            np.take(self.world, self.parents[level], axis=0, out=parentWorld[level], mode="clip")
+            np.matmul(parentWorld[level], self.local[level], out=self.world[level])
+        return self.world
+
+    def buildPending(self):
+        """Local matrices of every node given by setTRS since the last update.
+        A few are built one by one right into the stack, more in one batched call."""
+        pending = [node for node in self.pending if node.trsPending]
+        self.pending = []
+        if len(pending) == 0:
+            return
+        if len(pending) < TRS_BATCH:
+            for node in pending:
+                node.buildTransform()
+            return
+        translations, rotations, scalings = (np.array(part) for part in zip(*[node.trs for node in pending]))
+        self.local[[node.slot for node in pending]] = qt.toTRS(translations, rotations, scalings)
+        for node in pending:
+            node.trsPending = False
+
+    def updateBounds(self):
+        """World space AABB of every node, enclosing all the leaves below it.
+        Nodes with no bounded leaf keep an empty box (min inf, max -inf)."""
+        self.aabbMin.fill(np.inf)
+        self.aabbMax.fill(-np.inf)
+        if len(self.leaves) == 0:
+            return
+
+        # Leaf corners to world space, then the box around them
+        count = len(self.leaves)
+        leafWorld = np.take(self.world, self.leafSlots, axis=0, out=self.scratch("leafWorld", (count, 4, 4)), mode="clip")
+        corners = self.scratch("corners", (count, 8, 4, 1))
+        np.matmul(leafWorld[:, None, :, :], self.leafCorners[:, :, :, None], out=corners)
+        leafMin = np.min(corners[:, :, 0:3, 0], axis=1, out=self.scratch("leafMin", (count, 3)))
+        leafMax = np.max(corners[:, :, 0:3, 0], axis=1, out=self.scratch("leafMax", (count, 3)))
+        # Leaves without bounds keep an empty box
+        leafMin[self.unboundedLeaves] = np.inf
+        leafMax[self.unboundedLeaves] = -np.inf
+        self.aabbMin[self.leafSlots] = leafMin
+        self.aabbMax[self.leafSlots] = leafMax
+
+        # Deepest level first, each node grows its parent box
+        for level in reversed(self.levelSlices[1:]):
+            np.minimum.at(self.aabbMin, self.parents[level], self.aabbMin[level])
+            np.maximum.at(self.aabbMax, self.parents[level], self.aabbMax[level])
+
+    def bounds(self, node):
+        return self.aabbMin[node.slot], self.aabbMax[node.slot]
+
+    def cull(self, planes, bvh=None):
+        """Mask of visible leaves for the frustum planes of tr.frustumPlanes.
+        A node is outside when its box is behind any plane, and then so is
+        its whole subtree. Leaves without bounds are never culled.
+        With a SceneBVH over some of the nodes, the subtree of each of its
+        items is kept or culled whole by walking its hierarchy, refit with
+        the boxes of this frame; only the nodes outside of it are tested one by one.
+        The mask and every intermediate are buffers of the list, reused by the next cull."""
+        self.updateBounds()
+        if bvh is not None:
+            bvh.rebuildIfStale()
+        tested = self.allSlots if bvh is None else bvh.unowned
+        count, planeCount = len(tested), len(planes)
+        boxMin = np.take(self.aabbMin, tested, axis=0, out=self.scratch("boxMin", (count, 3)), mode="clip")
+        boxMax = np.take(self.aabbMax, tested, axis=0, out=self.scratch("boxMax", (count, 3)), mode="clip")
+        axes = np.greater(boxMin, boxMax, out=self.scratch("emptyAxes", (count, 3), bool))
+        filled = np.logical_not(np.any(axes, axis=1, out=self.scratch("empty", (count,), bool)), out=self.scratch("filled", (count,), bool))
+
+        # Corner of each box furthest along each plane normal
+        normals, distances = planes[:, 0:3], planes[:, 3]
+        positive = np.greater_equal(normals, 0, out=self.scratch("positive", (planeCount, 3), bool))
+        farthest = self.scratch("farthest", (count, planeCount, 3))
+        np.copyto(farthest, boxMin[:, None, :])
+        np.copyto(farthest, boxMax[:, None, :], where=positive[None, :, :])
+        signed = np.einsum('npk,pk->np', farthest, normals, out=self.scratch("signed", (count, planeCount)))
+        signed += distances
+        behind = np.less(signed, 0, out=self.scratch("behind", (count, planeCount), bool))
+        testedOutside = np.any(behind, axis=1, out=self.scratch("testedOutside", (count,), bool))
+        np.logical_and(testedOutside, filled, out=testedOutside)
+        outside = self.scratch("outside", (len(self.nodes),), bool)
+        outside.fill(False)
+        outside[tested] = testedOutside
+
+        visible = np.take(outside, self.leafSlots, out=self.scratch("visible", (len(self.leaves),), bool), mode="clip")
+        np.logical_not(visible, out=visible)
+        np.logical_or(visible, self.leafUnbounded, out=visible)
+        culledRoots = np.take(outside, self.parentSlots, out=self.scratch("culledRoots", (len(self.nodes),), bool), mode="clip")
+        np.logical_not(culledRoots, out=culledRoots)
+        np.logical_and(culledRoots, outside, out=culledRoots)
+        culledRoots[0] = outside[0]
+        culledNodes, culledSubtrees = int(outside.sum()), int(culledRoots.sum())
+
+        if bvh is not None:
+            bvh.refit(boundsUpdated=True)
+            itemVisible = bvh.cullMask(planes)
+            owned = np.take(itemVisible, bvh.leafOwners, out=self.scratch("ownedVisible", (len(bvh.leafOwners),), bool), mode="clip")
+            np.logical_or(owned, bvh.ownedUnbounded, out=owned)
+            visible[bvh.ownedLeaves] = owned
+            hidden = np.logical_not(itemVisible, out=self.scratch("hiddenItems", (len(itemVisible),), bool))
+            culledNodes += int(np.sum(bvh.itemNodes, where=hidden))
+            culledSubtrees += int(hidden.sum())
+
+        self.stats = {
+            "nodes": len(self.nodes),
+            "culledNodes": culledNodes,
+            "culledSubtrees": culledSubtrees,
+            "culledLeaves": len(visible) - int(visible.sum()),
+        }
+        return visible
+
+
+def compileRenderList(root):
+    return RenderList(root)
+
 
+def drawRenderList(renderList, pipeline, transformName, parentTransform=tr.identity(), queue=None, planes=None, bvh=None):
+    """Draws every leaf, or submits it to a RenderQueue to be drawn sorted by its flush.
+    With the frustum planes of tr.frustumPlanes, leaves outside the frustum are skipped,
+    the ones below the items of a SceneBVH found through its hierarchy (see RenderList.cull)."""
+    world = renderList.update(parentTransform)
+    visible = renderList.cull(planes, bvh) if planes is not None else None
+    for i, (slot, leaf) in enumerate(renderList.leaves):
+        if visible is not None and not visible[i]:
+            continue
+        if queue is not None:
+            queue.submit(pipeline, leaf, world[slot])
+        else:
+            pipeline.set_mat4(transformName, world[slot])
+            pipeline.drawCall(leaf)
@@ -0,0 +1,120 @@
+# coding=utf-8
+"""Compiled shader programs cached by source hash, optionally also on disk"""
+
+import hashlib
+import os.path
+import numpy as np
+from OpenGL.GL import *
+import OpenGL.GL.shaders
+from pyglet.graphics.shader import Shader, ShaderProgram
+
+
+def sourceHash(*sources):
+    digest = hashlib.sha1()
+    for source in sources:
+        if not isinstance(source, str): # shaders read with readlines()
+            source = "".join(source)
+        digest.update(source.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ShaderCache:
+    """
+    Every program is compiled and linked once per process. With binaryDir
+    set, PyOpenGL programs are also saved with glGetProgramBinary and
+    loaded back with glProgramBinary on the next run, falling back to a
+    normal compile when the driver rejects the binary.
+    """
+    def __init__(self, binaryDir=None):
+        self.binaryDir = binaryDir
+        self.programs = {}
+        self.compiled = 0
+        self.loaded = 0
+
+    def pygletProgram(self, vertexSource, fragmentSource):
+        """A pyglet ShaderProgram, as used for the curve overlay"""
+        key = ("pyglet", sourceHash(vertexSource, fragmentSource))
+        if key not in self.programs:
+            self.programs[key] = ShaderProgram(Shader(vertexSource, "vertex"), Shader(fragmentSource, "fragment"))
+            self.compiled += 1
+        return self.programs[key]
+
+    def glProgram(self, vertexSource, fragmentSource):
+        """A PyOpenGL program, as used by the pipelines in lighting_shaders"""
+        key = ("gl", sourceHash(vertexSource, fragmentSource))
+        if key not in self.programs:
+            program = self._loadBinary(key[1])
+            if program is None:
+                program = OpenGL.GL.shaders.compileProgram(
+                    OpenGL.GL.shaders.compileShader(vertexSource, GL_VERTEX_SHADER),
+                    OpenGL.GL.shaders.compileShader(fragmentSource, GL_FRAGMENT_SHADER))
+                self.compiled += 1
+                self._saveBinary(key[1], program)
+            else:
+                self.loaded += 1
+            self.programs[key] = program
+        return self.programs[key]
+
+    def _binaryPath(self, digest):
+        # Binaries only work on the driver that produced them
+        driver = sourceHash(str(glGetString(GL_RENDERER)), str(glGetString(GL_VERSION)))
+        return os.path.join(self.binaryDir, digest + "_" + driver[:8] + ".glbin")
+
+    def _loadBinary(self, digest):
+        if self.binaryDir is None:
+            return None
+        path = self._binaryPath(digest)
+        if not os.path.exists(path):
+            return None
+
+        data = np.fromfile(path, dtype=np.uint8)
+        binaryFormat = int(data[:4].view(np.uint32)[0])
+        binary = data[4:]
+
+        program = glCreateProgram()
+        glProgramBinary(program, binaryFormat, binary, len(binary))
+        if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+            glDeleteProgram(program)
+            return None
+        return program
+
+    def _saveBinary(self, digest, program):
+        if self.binaryDir is None:
+            return
+        length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return
+
+        binary = np.zeros(length, dtype=np.uint8)
+        written = np.zeros(1, dtype=np.int32)
+        binaryFormat = np.zeros(1, dtype=np.uint32)
+        glGetProgramBinary(program, length, written, binaryFormat, binary)
+
+        try:
+            os.makedirs(self.binaryDir, exist_ok=True)
+            with open(self._binaryPath(digest), 'wb') as file:
+                file.write(binaryFormat.tobytes())
+                file.write(binary[:written[0]].tobytes())
+        except OSError:
+            pass
+
+    def clear(self):
+        for key, program in self.programs.items():
+            if key[0] == "gl":
+                glDeleteProgram(program)
+            else:
+                program.delete()
+        self.programs = {}
+
+
+_cache = ShaderCache()
+
+
+def getShaderCache():
+    return _cache
+
+
+def compileProgram(vertexSource, fragmentSource):
+    """Drop-in replacement of the compileProgram(compileShader(...), ...) idiom, compiling each source pair once"""
+    return _cache.glProgram(vertexSource, fragmentSource)
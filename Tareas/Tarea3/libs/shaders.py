@@ -4,43 +4,52 @@ import numpy as np
 from PIL import Image
 
 from libs.gpu_shape import GPUShape
+from libs.uniforms import UniformCacheMixin
 
 SIZE_IN_BYTES = 4
 
 
-def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
-    # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
-    # filterMode: GL_LINEAR, GL_NEAREST
-    texture = glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, texture)
-
-    # texture wrapping params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, sWrapMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, tWrapMode)
-
-    # texture filtering params
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilterMode)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, maxFilterMode)
-
+def decodeImage(imgName):
+    """Reads an image file into an uint8 array, safe to call outside the GL thread"""
     image = Image.open(imgName)
     img_data = np.array(image, np.uint8)
 
     if image.mode == "RGB":
-        internalFormat = GL_RGB
         format = GL_RGB
     elif image.mode == "RGBA":
-        internalFormat = GL_RGBA
         format = GL_RGBA
     else:
         print("Image mode not supported.")
         raise Exception()
 
-    glTexImage2D(GL_TEXTURE_2D, 0, internalFormat, image.size[0], image.size[1], 0, format, GL_UNSIGNED_BYTE, img_data)
+    return img_data, image.size[0], image.size[1], format
 
+
+def uploadTexture(texture, decodedImage, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
+    """Fills an existing GL texture with the result of decodeImage"""
+    img_data, width, height, format = decodedImage
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+    # texture wrapping params
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, sWrapMode)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, tWrapMode)
+
+    # texture filtering params
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, minFilterMode)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, maxFilterMode)
+
+    glTexImage2D(GL_TEXTURE_2D, 0, format, width, height, 0, format, GL_UNSIGNED_BYTE, img_data)
+
+
+def textureSimpleSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
+    # wrapMode: GL_REPEAT, GL_CLAMP_TO_EDGE
+    # filterMode: GL_LINEAR, GL_NEAREST
+    texture = glGenTextures(1)
+    uploadTexture(texture, decodeImage(imgName), sWrapMode, tWrapMode, minFilterMode, maxFilterMode)
     return texture
 
 
-class SimpleModelViewProjectionShaderProgram:
+class SimpleModelViewProjectionShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -82,6 +91,7 @@ class SimpleModelViewProjectionShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape):
@@ -92,15 +102,15 @@ class SimpleModelViewProjectionShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 3*4 + 3*4 = 36 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "color")
+        color = self.attribLocation("color")
         glVertexAttribPointer(color, 3, GL_FLOAT, GL_FALSE, 36, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         if normal >= 0:
             glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
             glEnableVertexAttribArray(normal)
@@ -121,7 +131,7 @@ class SimpleModelViewProjectionShaderProgram:
         glBindVertexArray(0)
 
 
-class SimpleTextureModelViewProjectionShaderProgram:
+class SimpleTextureModelViewProjectionShaderProgram(UniformCacheMixin):
 
     def __init__(self):
 
@@ -165,6 +175,7 @@ class SimpleTextureModelViewProjectionShaderProgram:
         self.shaderProgram = OpenGL.GL.shaders.compileProgram(
             OpenGL.GL.shaders.compileShader(vertex_shader, OpenGL.GL.GL_VERTEX_SHADER),
             OpenGL.GL.shaders.compileShader(fragment_shader, OpenGL.GL.GL_FRAGMENT_SHADER))
+        self.cacheLocations()
 
 
     def setupVAO(self, gpuShape, obj):
@@ -175,17 +186,17 @@ class SimpleTextureModelViewProjectionShaderProgram:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, gpuShape.ebo)
 
         # 3d vertices + rgb color + 3d normals => 3*4 + 2*4 + 3*4 = 32 bytes
-        position = glGetAttribLocation(self.shaderProgram, "position")
+        position = self.attribLocation("position")
         if obj=="obj": glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
         else: glVertexAttribPointer(position, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
         glEnableVertexAttribArray(position)
 
-        color = glGetAttribLocation(self.shaderProgram, "texCoords")
+        color = self.attribLocation("texCoords")
         if obj=="obj": glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(12))
         else: glVertexAttribPointer(color, 2, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(12))
         glEnableVertexAttribArray(color)
 
-        normal = glGetAttribLocation(self.shaderProgram, "normal")
+        normal = self.attribLocation("normal")
         if normal >= 0:
             if obj=="obj": glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
             else: glVertexAttribPointer(normal, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(20))
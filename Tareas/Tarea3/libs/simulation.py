@@ -0,0 +1,66 @@
+# coding=utf-8
+"""Fixed timestep simulation clock, independent of the frame rate"""
+
+import math
+import numpy as np
+import pyglet
+
+# Rounding margin, so a sum of frame times equal to a whole step is not one tick short
+EPSILON = 1e-9
+
+
+class SimulationClock:
+    """
+    Runs tick(step) at a fixed rate, whatever the rate of the calls to advance.
+    Elapsed time goes into an accumulator that is spent in whole steps; what
+    is left, as a fraction of a step in alpha, is how far rendering should
+    interpolate from the previous simulated state to the current one.
+    A slow frame catches up with at most maxSteps ticks, the rest of the
+    time is dropped so the simulation can never fall further and further behind.
+    """
+    def __init__(self, tick, rate=60, maxSteps=5):
+        self.tick = tick
+        self.step = 1.0 / rate # seconds per tick
+        self.maxSteps = maxSteps
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.time = 0.0 # simulated time
+        self.ticks = 0
+        self.dropped = 0.0 # seconds discarded by the catch up cap
+
+    def advance(self, dt):
+        """Ticks for the elapsed dt, returns how many ran"""
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.step - EPSILON and steps < self.maxSteps:
+            self.tick(self.step)
+            self.accumulator -= self.step
+            self.time += self.step
+            steps += 1
+        if self.accumulator >= self.step - EPSILON:
+            whole = math.floor((self.accumulator + EPSILON) / self.step) * self.step
+            self.dropped += whole
+            self.accumulator = max(self.accumulator - whole, 0.0)
+        self.ticks += steps
+        self.alpha = min(max(self.accumulator / self.step, 0.0), 1.0)
+        return steps
+
+    def schedule(self, interval=None):
+        """Advances from pyglet's clock, every frame or every interval seconds"""
+        if interval is None:
+            pyglet.clock.schedule(self.advance)
+        else:
+            pyglet.clock.schedule_interval(self.advance, interval)
+
+    def unschedule(self):
+        pyglet.clock.unschedule(self.advance)
+
+
+def interpolate(previous, current, alpha, out=None):
+    """previous + (current - previous) * alpha, written into out if given"""
+    if out is None:
+        return previous + (current - previous) * alpha
+    np.subtract(current, previous, out=out)
+    out *= alpha
+    out += previous
+    return out
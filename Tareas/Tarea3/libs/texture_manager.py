@@ -0,0 +1,83 @@
+# coding=utf-8
+"""Texture cache with image decoding on a thread pool"""
+
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+from OpenGL.GL import *
+
+from libs.shaders import decodeImage, uploadTexture
+from libs.gpu_shape import sharedTextures
+
+
+class TextureManager:
+    """
+    GL textures cached by (path, wrap modes, filter modes).
+    A miss reserves the texture name right away and decodes the image on a
+    thread pool. The pixels are uploaded later by uploadPending, which
+    must be called from the GL thread (for instance once the meshes are
+    loaded, and then at the start of each frame).
+    """
+    def __init__(self, workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.decoded = {} # path -> future with the decoded image
+        self.textures = {} # (path, params) -> texture
+        self.pending = [] # (texture, future, params) waiting for upload
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, imgName):
+        """Starts decoding an image without creating its texture yet"""
+        path = os.path.abspath(imgName)
+        if path not in self.decoded:
+            self.decoded[path] = self.pool.submit(decodeImage, path)
+        return self.decoded[path]
+
+    def get(self, imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
+        params = (sWrapMode, tWrapMode, minFilterMode, maxFilterMode)
+        key = (os.path.abspath(imgName), params)
+        if key in self.textures:
+            self.hits += 1
+            return self.textures[key]
+
+        self.misses += 1
+        texture = glGenTextures(1)
+        self.textures[key] = texture
+        sharedTextures.add(texture)
+        self.pending += [(texture, self.prefetch(imgName), params)]
+        return texture
+
+    def uploadPending(self, block=False):
+        """Uploads every decoded image, waiting for the rest only if block is True"""
+        waiting = []
+        for texture, future, params in self.pending:
+            if block or future.done():
+                uploadTexture(texture, future.result(), *params)
+            else:
+                waiting += [(texture, future, params)]
+        self.pending = waiting
+        return len(waiting)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "textures": len(self.textures), "pending": len(self.pending)}
+
+    def clear(self):
+        """Freeing GPU memory and the decoded images"""
+
+        if len(self.textures) > 0:
+            glDeleteTextures(len(self.textures), list(self.textures.values()))
+            sharedTextures.difference_update(self.textures.values())
+        self.textures = {}
+        self.decoded = {}
+        self.pending = []
+
+
+_manager = TextureManager()
+
+
+def getManager():
+    return _manager
+
+
+def textureCachedSetup(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode):
+    """Drop-in replacement of textureSimpleSetup that shares textures, call uploadPending before drawing"""
+    return _manager.get(imgName, sWrapMode, tWrapMode, minFilterMode, maxFilterMode)
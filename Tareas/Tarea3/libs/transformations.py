@@ -1,65 +1,82 @@
 # coding=utf-8
 """Transformation matrices for computer graphics"""
 
+import math
 import numpy as np
 
 __author__ = "Daniel Calderon"
 __license__ = "MIT"
 
-def identity():
-    return np.identity(4, dtype=np.float32)
+# Every affine builder takes an optional out, a preallocated 4x4 float32 array
+# that is filled element by element and returned, so no new array is created
 
+def _matrix(rows, out):
+    if out is None:
+        return np.array(rows, dtype = np.float32)
+    for i, row in enumerate(rows):
+        for j, value in enumerate(row):
+            out[i, j] = value
+    return out
 
-def uniformScale(s):
-    return np.array([
+
+def identity(out=None):
+    if out is None:
+        return np.identity(4, dtype=np.float32)
+    out.fill(0)
+    out[0, 0] = out[1, 1] = out[2, 2] = out[3, 3] = 1
+    return out
+
+
+def uniformScale(s, out=None):
+    return _matrix([
         [s,0,0,0],
         [0,s,0,0],
         [0,0,s,0],
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 
-def scale(sx, sy, sz):
-    return np.array([
+def scale(sx, sy, sz, out=None):
+    return _matrix([
         [sx,0,0,0],
         [0,sy,0,0],
         [0,0,sz,0],
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 
-def rotationX(theta):
+def rotationX(theta, out=None):
     sin_theta = np.sin(theta)
     cos_theta = np.cos(theta)
 
-    return np.array([
+    return _matrix([
         [1,0,0,0],
         [0,cos_theta,-sin_theta,0],
         [0,sin_theta,cos_theta,0],
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 
-def rotationY(theta):
+def rotationY(theta, out=None):
     sin_theta = np.sin(theta)
     cos_theta = np.cos(theta)
 
-    return np.array([
+    return _matrix([
         [cos_theta,0,sin_theta,0],
         [0,1,0,0],
         [-sin_theta,0,cos_theta,0],
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 
-def rotationZ(theta):
+def rotationZ(theta, out=None):
     sin_theta = np.sin(theta)
     cos_theta = np.cos(theta)
 
-    return np.array([
+    return _matrix([
         [cos_theta,-sin_theta,0,0],
         [sin_theta,cos_theta,0,0],
         [0,0,1,0],
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 
-def rotationA(theta, axis):
+def rotationA(theta, axis, out=None):
     s = np.sin(theta)
     c = np.cos(theta)
 
@@ -69,7 +86,7 @@ def rotationA(theta, axis):
     y = axis[1]
     z = axis[2]
 
-    return np.array([
+    return _matrix([
         # First row
         [c + (1 - c) * x * x,
         (1 - c) * x * y - s * z,
@@ -86,7 +103,7 @@ def rotationA(theta, axis):
         c + (1 - c) * z * z,
         0],
         # Fourth row
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 def rotationAxis(theta, point1, point2):
     axis = point2-point1
@@ -125,27 +142,49 @@ def rotationAxis(theta, point1, point2):
 
     return matmul([Tinv,Ryinv,Rzinv,Rx,Rz,Ry,T])
     
-def translate(tx, ty, tz):
-    return np.array([
+def translate(tx, ty, tz, out=None):
+    return _matrix([
         [1,0,0,tx],
         [0,1,0,ty],
         [0,0,1,tz],
-        [0,0,0,1]], dtype = np.float32)
+        [0,0,0,1]], out)
 
 
-def shearing(xy, yx, xz, zx, yz, zy):
-    return np.array([
+def shearing(xy, yx, xz, zx, yz, zy, out=None):
+    return _matrix([
         [ 1, xy, xz, 0],
         [yx,  1, yz, 0],
         [zx, zy,  1, 0],
-        [ 0,  0,  0, 1]], dtype = np.float32)
-
-
-def matmul(mats):
-    out = mats[0]
+        [ 0,  0,  0, 1]], out)
+
+
+# Scratch buffer per shape for matmul with out, the partial products
+# alternate between it and out
+_scratch = {}
+
+def matmul(mats, out=None):
+    """Product of mats from left to right. With out, the product is written
+    there without temporaries; out must not be one of mats."""
+    if out is None:
+        out = mats[0]
+        for i in range(1, len(mats)):
+            out = np.matmul(out, mats[i])
+        return out
+
+    if len(mats) == 1:
+        out[...] = mats[0]
+        return out
+    if out.shape not in _scratch:
+        _scratch[out.shape] = np.empty_like(out)
+    scratch = _scratch[out.shape]
+
+    # The last product has to land in out
+    products = len(mats) - 1
+    previous = mats[0]
     for i in range(1, len(mats)):
-        out = np.matmul(out, mats[i])
-
+        target = out if (products - i) % 2 == 0 else scratch
+        np.matmul(previous, mats[i], out=target)
+        previous = target
     return out
 
 
@@ -201,20 +240,128 @@ def ortho(left, right, bottom, top, near, far):
         1]], dtype = np.float32)
 
 
-def lookAt(eye, at, up):
+def lookAt(eye, at, up, out=None):
+    # Worked out on python floats, with out no array is created
+    ex, ey, ez = float(eye[0]), float(eye[1]), float(eye[2])
+    fx, fy, fz = _normalized(at[0] - ex, at[1] - ey, at[2] - ez)
+    sx, sy, sz = _normalized(fy*up[2] - fz*up[1], fz*up[0] - fx*up[2], fx*up[1] - fy*up[0])
+    ux, uy, uz = _normalized(sy*fz - sz*fy, sz*fx - sx*fz, sx*fy - sy*fx)
 
-    forward = (at - eye)
-    forward = forward / np.linalg.norm(forward)
+    return _matrix([
+            [sx,   sy,  sz, -(sx*ex + sy*ey + sz*ez)],
+            [ux,   uy,  uz, -(ux*ex + uy*ey + uz*ez)],
+            [-fx, -fy, -fz, fx*ex + fy*ey + fz*ez],
+            [0,0,0,1]
+        ], out)
 
-    side = np.cross(forward, up)
-    side = side / np.linalg.norm(side)
 
-    newUp = np.cross(side, forward)
-    newUp = newUp / np.linalg.norm(newUp)
+def _normalized(x, y, z):
+    length = math.sqrt(x*x + y*y + z*z)
+    return x / length, y / length, z / length
 
-    return np.array([
-            [side[0],       side[1],    side[2], -np.dot(side, eye)],
-            [newUp[0],     newUp[1],   newUp[2], -np.dot(newUp, eye)],
-            [-forward[0], -forward[1], -forward[2], np.dot(forward, eye)],
-            [0,0,0,1]
-        ], dtype = np.float32)
+
+_clip = np.empty((4, 4), dtype=np.float32)
+
+def frustumPlanes(projection, view, out=None):
+    """The 6 planes (a,b,c,d) of the view frustum, normals pointing inside.
+    A point p is inside when a*x + b*y + c*z + d >= 0 for every plane.
+    They are written into out, a (6,4) float32 array, if given."""
+    if out is None:
+        out = np.empty((6, 4), dtype=np.float32)
+    clip = np.matmul(projection, view, out=_clip)
+    for axis in range(3):
+        np.add(clip[3], clip[axis], out=out[2*axis]) # left, bottom, near
+        np.subtract(clip[3], clip[axis], out=out[2*axis + 1]) # right, top, far
+    for plane in out:
+        plane /= math.sqrt(plane[0]*plane[0] + plane[1]*plane[1] + plane[2]*plane[2])
+    return out
+
+
+# Batched versions: parameters are scalars or arrays of length N and the
+# result is a (N,4,4) float32 stack, one matrix per set of parameters
+
+def _identities(*params):
+    params = np.broadcast_arrays(*[np.atleast_1d(np.asarray(p, dtype=np.float64)) for p in params])
+    stack = np.zeros((len(params[0]), 4, 4), dtype=np.float32)
+    stack[:, [0, 1, 2, 3], [0, 1, 2, 3]] = 1
+    return stack, params
+
+
+def translateBatch(tx, ty, tz):
+    stack, (tx, ty, tz) = _identities(tx, ty, tz)
+    stack[:, 0, 3], stack[:, 1, 3], stack[:, 2, 3] = tx, ty, tz
+    return stack
+
+
+def scaleBatch(sx, sy, sz):
+    stack, (sx, sy, sz) = _identities(sx, sy, sz)
+    stack[:, 0, 0], stack[:, 1, 1], stack[:, 2, 2] = sx, sy, sz
+    return stack
+
+
+def uniformScaleBatch(s):
+    return scaleBatch(s, s, s)
+
+
+def _rotationBatch(theta, i, j):
+    # Rotation in the (i, j) plane: [[c, -s], [s, c]] on those rows and columns
+    stack, (theta,) = _identities(theta)
+    sin_theta, cos_theta = np.sin(theta), np.cos(theta)
+    stack[:, i, i], stack[:, i, j] = cos_theta, -sin_theta
+    stack[:, j, i], stack[:, j, j] = sin_theta, cos_theta
+    return stack
+
+
+def rotationXBatch(theta):
+    return _rotationBatch(theta, 1, 2)
+
+
+def rotationYBatch(theta):
+    return _rotationBatch(theta, 2, 0)
+
+
+def rotationZBatch(theta):
+    return _rotationBatch(theta, 0, 1)
+
+
+def trsBatch(translation, rotation, scaling):
+    """translate(t) * rotationZ(rz) * rotationY(ry) * rotationX(rx) * scale(s) in one step.
+    translation, rotation (rx, ry, rz) and scaling are (N,3) arrays or 3-tuples."""
+    translation = np.atleast_2d(np.asarray(translation, dtype=np.float64))
+    rotation = np.atleast_2d(np.asarray(rotation, dtype=np.float64))
+    scaling = np.atleast_2d(np.asarray(scaling, dtype=np.float64))
+    n = max(len(translation), len(rotation), len(scaling))
+
+    sx, sy, sz = np.sin(rotation).T
+    cx, cy, cz = np.cos(rotation).T
+
+    # Columns of Rz*Ry*Rx, each one multiplied by its scale factor
+    stack = np.zeros((n, 4, 4), dtype=np.float32)
+    stack[:, 0, 0] = cz*cy
+    stack[:, 1, 0] = sz*cy
+    stack[:, 2, 0] = -sy
+    stack[:, 0, 1] = cz*sy*sx - sz*cx
+    stack[:, 1, 1] = sz*sy*sx + cz*cx
+    stack[:, 2, 1] = cy*sx
+    stack[:, 0, 2] = cz*sy*cx + sz*sx
+    stack[:, 1, 2] = sz*sy*cx - cz*sx
+    stack[:, 2, 2] = cy*cx
+    stack[:, 0:3, 0:3] *= scaling[:, None, :]
+    stack[:, 0:3, 3] = translation
+    stack[:, 3, 3] = 1
+    return stack
+
+
+def trs(translation, rotation, scaling, out=None):
+    """Single matrix version of trsBatch, without the overhead of a stack"""
+    tx, ty, tz = translation
+    rx, ry, rz = rotation
+    sx, sy, sz = np.sin(rx), np.sin(ry), np.sin(rz)
+    cx, cy, cz = np.cos(rx), np.cos(ry), np.cos(rz)
+    ax, ay, az = scaling
+
+    return _matrix([
+        [cz*cy*ax, (cz*sy*sx - sz*cx)*ay, (cz*sy*cx + sz*sx)*az, tx],
+        [sz*cy*ax, (sz*sy*sx + cz*cx)*ay, (sz*sy*cx - cz*sx)*az, ty],
+        [-sy*ax, cy*sx*ay, cy*cx*az, tz],
+        [0,0,0,1]], out)
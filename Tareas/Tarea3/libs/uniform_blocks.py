@@ -0,0 +1,127 @@
+# coding=utf-8
+"""std140 uniform buffers shared by every program: camera and lighting state"""
+
+from OpenGL.GL import *
+import numpy as np
+
+# Binding points, the same for every program that declares the blocks.
+# pyglet keeps 0 for its WindowBlock, rebinding it whenever the window
+# projection or view is set, and hands out the rest from 1 upwards; these
+# are well above its pool and below the 36 bindings GL 3.3 guarantees.
+CAMERA_BINDING = 30
+LIGHTING_BINDING = 31
+
+# GLSL declarations, row_major so matrices from transformations are copied as they are
+#   layout (std140, row_major) uniform Camera
+#   {
+#       mat4 view;              // offset 0
+#       mat4 projection;        // offset 64
+#       vec3 viewPosition;      // offset 128
+#   };
+#   layout (std140) uniform Lighting
+#   {
+#       vec3 La;                // offset 0
+#       vec3 Ld;                // offset 16
+#       vec3 Ls;                // offset 32
+#       vec3 Ka;                // offset 48
+#       vec3 Kd;                // offset 64
+#       vec3 Ks;                // offset 80
+#       vec3 lightPosition;     // offset 96
+#       uint shininess;         // offset 108
+#       float constantAttenuation;  // offset 112
+#       float linearAttenuation;    // offset 116
+#       float quadraticAttenuation; // offset 120
+#   };
+
+
+def bindUniformBlocks(program):
+    """Connects the Camera and Lighting blocks of a program to their binding points"""
+    for name, binding in [("Camera", CAMERA_BINDING), ("Lighting", LIGHTING_BINDING)]:
+        index = glGetUniformBlockIndex(program, name)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(program, index, binding)
+
+
+class UniformBlock:
+    """
+    A uniform buffer with a CPU copy of its contents.
+    Setters only write the copy; upload sends it with a single
+    glBufferSubData, and only if something changed since the last one.
+    """
+    def __init__(self, binding, size):
+        self.binding = binding
+        self.data = np.zeros(size // 4, dtype=np.float32)
+        self.staged = np.empty_like(self.data) # values of write, as float32
+        self.changedMask = np.empty(size // 4, dtype=bool)
+        self.dirty = True
+        self.uploads = 0
+        self.ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, size, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, binding, self.ubo)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def write(self, offset, values):
+        # Arrays are staged in a buffer of the block, only lists become new ones
+        values = np.asarray(values, dtype=np.float32) if not isinstance(values, np.ndarray) else values
+        values = values.reshape(-1)
+        start, count = offset // 4, len(values)
+        staged = self.staged[0:count]
+        np.copyto(staged, values, casting="unsafe")
+        if np.not_equal(self.data[start:start + count], staged, out=self.changedMask[0:count]).any():
+            self.data[start:start + count] = staged
+            self.dirty = True
+
+    def writeUint(self, offset, value):
+        view = self.data.view(np.uint32)
+        if view[offset // 4] != value:
+            view[offset // 4] = value
+            self.dirty = True
+
+    def upload(self):
+        if not self.dirty:
+            return
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.dirty = False
+        self.uploads += 1
+
+    def clear(self):
+        """Freeing GPU memory"""
+
+        glDeleteBuffers(1, [self.ubo])
+
+
+class CameraBlock(UniformBlock):
+    def __init__(self):
+        super().__init__(CAMERA_BINDING, 144)
+
+    def setView(self, view):
+        self.write(0, view)
+
+    def setProjection(self, projection):
+        self.write(64, projection)
+
+    def setViewPosition(self, eye):
+        self.write(128, eye[0:3])
+
+
+class LightingBlock(UniformBlock):
+    def __init__(self):
+        super().__init__(LIGHTING_BINDING, 128)
+
+    def setLight(self, La, Ld, Ls, position):
+        self.write(0, La)
+        self.write(16, Ld)
+        self.write(32, Ls)
+        self.write(96, position)
+
+    def setMaterial(self, Ka, Kd, Ks, shininess):
+        self.write(48, Ka)
+        self.write(64, Kd)
+        self.write(80, Ks)
+        self.writeUint(108, shininess)
+
+    def setAttenuation(self, constant, linear, quadratic):
+        self.write(112, [constant, linear, quadratic])
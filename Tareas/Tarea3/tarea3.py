@@ -1,17 +1,25 @@
 # coding=utf-8
 import sys, os, pyglet
+import libs.headless as hl
+HEADLESS = hl.parseOptions(sys.argv[1:]) # None when drawing to a window, before pyglet.gl is loaded
 import numpy as np
 import libs.transformations as tr
+import libs.quaternions as qt
+import libs.curves as cv
+import libs.simulation as sim
 import libs.scene_graph as sg
 import libs.shapes as shp
-import libs.shaders as sh
 import libs.lighting_shaders as ls
+import libs.mesh_registry as mr
+import libs.texture_manager as tm
+import libs.shader_cache as sc
+import libs.uniform_blocks as ub
+from libs.curve_renderer import CurveRenderer
+from libs.render_queue import RenderQueue
+from libs.bvh import SceneBVH
 
 from libs.gpu_shape import createGPUShape
-from libs.obj_handler import read_OBJ2
 from libs.assets_path import getAssetPath
-from pyglet.graphics.shader import Shader, ShaderProgram
-from itertools import chain
 from pathlib import Path
 from OpenGL.GL import *
 
@@ -30,6 +38,9 @@ from OpenGL.GL import *
 
 # Initial data
 N=50
+PATH_SPEED = 10 # world units per second when reproducing the path
+SIMULATION_RATE = 60 # ticks per second, the per tick steps of Movement are tuned for 60
+RENDER_RATE = 60 # frames per second
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 ASSETS = {
     "ship_obj": getAssetPath("ship.obj"), "ship_tex": getAssetPath("ship.png"), # models and textures by me
@@ -42,60 +53,43 @@ ASSETS = {
     "icon": getAssetPath("icon.png"), # icon by Freepik
 }
 
-# Aspect ratio and projection
-display = pyglet.canvas.Display()
-screen = display.get_default_screen()
-screen_height, screen_width = screen.height, screen.width
+# Aspect ratio and projection, of the screen or of the offscreen target
+if HEADLESS is None:
+    display = pyglet.canvas.Display()
+    screen = display.get_default_screen()
+    screen_height, screen_width = screen.height, screen.width
+else:
+    screen_height, screen_width = HEADLESS.height, HEADLESS.width
 PROJECTIONS = [
     tr.ortho(-10*screen_width/screen_height, 10*screen_width/screen_height, -10, 10, 0.1, 200),  # ORTOGRAPHIC_PROJECTION
     tr.perspective(100, float(screen_width)/float(screen_height), 0.1, 200)  # PERSPECTIVE_PROJECTION
 ]
 TEX = [GL_REPEAT, GL_REPEAT, GL_NEAREST, GL_NEAREST]
+LINE_SHADERS = [] # Curve vertex and fragment programs, read once
+for program in ["point_vertex_program.glsl", "point_fragment_program.glsl"]:
+    with open(Path(os.path.dirname(os.path.abspath(__file__))) / "shaders" / program) as f: LINE_SHADERS.append(f.read())
 
-# Hermite curve
-def hermiteMatrix(P1, P2, T1, T2):
-    # Generate a matrix concatenating the columns
-    G = np.concatenate((P1, P2, T1, T2), axis=1)
-    # Hermite base matrix is a constant
-    Mh = np.array([[1, 0, -3, 2], [0, 0, 3, -2], [0, 1, -2, 1], [0, 0, -1, 1]])
-    return np.matmul(G, Mh)
-
-# M is the cubic curve matrix, N is the number of samples between 0 and 1
-def evalCurve(M, N):
-    # The parameter t should move between 0 and 1
-    ts = np.linspace(0.0, 1.0, N)
-    # The computed value in R3 for each sample will be stored here
-    curve = np.ndarray(shape=(N, 3), dtype=float)
-    for i in range(len(ts)):
-        T = np.array([[1, ts[i], ts[i]**2, ts[i]**3]]).T
-        curve[i, 0:3] = np.matmul(M, T).T
-    return curve
-
-# Set lightning shader
-def setLightShader(shader):
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "La"), 0.8, 0.8, 0.8)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "Ld"), 0.9, 0.9, 0.9)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "Ls"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "Ka"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "Kd"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "Ks"), 1, 1, 1)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "lightPosition"), 0, 0, 25)
-    glUniform3f(glGetUniformLocation(shader.shaderProgram, "viewPosition"), camera.eye[0], camera.eye[1], camera.eye[2])
-    glUniform1ui(glGetUniformLocation(shader.shaderProgram, "shininess"), 300)
-    glUniform1f(glGetUniformLocation(shader.shaderProgram, "constantAttenuation"), 0.1)
-    glUniform1f(glGetUniformLocation(shader.shaderProgram, "linearAttenuation"), 0.1)
-    glUniform1f(glGetUniformLocation(shader.shaderProgram, "quadraticAttenuation"), 0.01)
+# Set lightning, shared by every program through the Lighting uniform block
+def setLightShader(lighting):
+    lighting.setLight([0.8, 0.8, 0.8], [0.9, 0.9, 0.9], [1, 1, 1], [0, 0, 25])
+    lighting.setMaterial([1, 1, 1], [1, 1, 1], [1, 1, 1], 300)
+    lighting.setAttenuation(0.1, 0.1, 0.01)
+    lighting.upload()
 
 # Controller of the pyglet window
 class Controller(pyglet.window.Window):
     def __init__(self, width, height, title=f"La mejor tarea 3 de la sección"):
         # Initial setup of the window
-        super().__init__(width, height, title, fullscreen=True)
-        self.set_exclusive_mouse(True)
-        self.set_icon(pyglet.image.load(ASSETS["icon"]))
+        if HEADLESS is None:
+            super().__init__(width, height, title, fullscreen=True)
+            self.set_exclusive_mouse(True)
+            self.set_icon(pyglet.image.load(ASSETS["icon"]))
+        else: # hidden, frames go to the framebuffer object of hl.run
+            super().__init__(width, height, title, visible=False)
         self.showCurve = False
         self.total_time = 0.0 # Time in the scene
-        self.step = 0
+        self.drawStats = {} # binds and draws of the last frame
+        self.cullStats = {} # nodes outside the frustum in the last frame
 
 # Scene graph manager
 class Scene:
@@ -104,12 +98,14 @@ class Scene:
         self.pipeline = ls.SimpleTexturePhongShaderProgram()
         self.root = sg.SceneGraphNode("root")
         self.tex_params = TEX
+        for name in ASSETS: # decode every texture while the meshes load
+            if name.endswith("_tex"): tm.getManager().prefetch(ASSETS[name])
 
         # --- Squad ---
-        ship_obj = createGPUShape(self.pipeline, read_OBJ2(ASSETS["ship_obj"]))
-        ship_obj.texture = sh.textureSimpleSetup(ASSETS["ship_tex"], *self.tex_params)
-        ship_shadow_obj = createGPUShape(self.pipeline, read_OBJ2(ASSETS["ship_obj"]))
-        ship_shadow_obj.texture = sh.textureSimpleSetup(ASSETS["black_tex"], *self.tex_params)
+        ship_obj = mr.createSharedGPUShape(self.pipeline, ASSETS["ship_obj"])
+        ship_obj.texture = tm.textureCachedSetup(ASSETS["ship_tex"], *self.tex_params)
+        ship_shadow_obj = mr.createSharedGPUShape(self.pipeline, ASSETS["ship_obj"])
+        ship_shadow_obj.texture = tm.textureCachedSetup(ASSETS["black_tex"], *self.tex_params)
         self.squad = sg.SceneGraphNode("squad")
         self.root.childs += [self.squad]
 
@@ -125,6 +121,11 @@ class Scene:
         self.at = sg.SceneGraphNode("at")
         self.up = sg.SceneGraphNode("up")
         self.squad.childs += [self.shipRotation, self.shipRotation2, self.shipRotation3, self.eye, self.up, self.at] # Add ships
+        self.shipRotation2.transform = tr.translate(-2, -1, 0)
+        self.shipRotation3.transform = tr.translate(-2, 1, 0)
+        self.eye.transform = tr.translate(-4.0, 0, 2.0)
+        self.at.transform = tr.translate(0.0, 0, 2.0)
+        self.up.transform = tr.translate(-4.0, 0, 3.0)
 
         # Shadows
         self.ship_shadows = sg.SceneGraphNode("ship_shadows")
@@ -135,6 +136,7 @@ class Scene:
         self.shipRotationShadow3 = sg.SceneGraphNode("shipRotationShadow3")
         self.shipRotationShadow3.childs += [ship_shadow_obj]
         self.ship_shadows.childs += [self.shipRotationShadow, self.shipRotationShadow2, self.shipRotationShadow3] # Add shadows
+        self.shipShadows = (self.shipRotationShadow, self.shipRotationShadow2, self.shipRotationShadow3)
         self.root.childs += [self.ship_shadows]
 
         # --- Scenery ---
@@ -143,24 +145,28 @@ class Scene:
         # Floor
         floor = sg.SceneGraphNode("floor")
         cube = createGPUShape(self.pipeline, shp.createTextureQuad(*[50, 50]), "cube")
-        cube.texture = sh.textureSimpleSetup(ASSETS["cube_tex"], *self.tex_params)
+        cube.texture = tm.textureCachedSetup(ASSETS["cube_tex"], *self.tex_params)
         floor.transform = tr.scale(200, 200, 1)
         floor.childs += [cube]
         self.scenario.childs += [floor]
 
     # Add scenery to the scene
     def addScenery(self, obj, tex, pos, rotX, rotZ, scale):
-        # Model
-        node = sg.SceneGraphNode(obj)
-        model = createGPUShape(self.pipeline, read_OBJ2(ASSETS[obj]))
-        model.texture = sh.textureSimpleSetup(ASSETS[tex], *self.tex_params)
+        # Model, repeated objects get a number since names are unique
+        name, copies = obj, 1
+        while sg.findNode(self.root, name) != None:
+            copies += 1
+            name = obj+str(copies)
+        node = sg.SceneGraphNode(name)
+        model = mr.createSharedGPUShape(self.pipeline, ASSETS[obj])
+        model.texture = tm.textureCachedSetup(ASSETS[tex], *self.tex_params)
         node.transform = tr.matmul([tr.translate(*pos), tr.uniformScale(scale), tr.rotationZ(rotZ), tr.rotationX(rotX)])
         node.childs += [model]
         self.scenario.childs += [node]
         # Shadow
-        shadow = sg.SceneGraphNode(obj+"_shadow")
-        shadow_model = createGPUShape(self.pipeline, read_OBJ2(ASSETS[obj]))
-        shadow_model.texture = sh.textureSimpleSetup(ASSETS["black_tex"], *self.tex_params)
+        shadow = sg.SceneGraphNode(name+"_shadow")
+        shadow_model = mr.createSharedGPUShape(self.pipeline, ASSETS[obj])
+        shadow_model.texture = tm.textureCachedSetup(ASSETS["black_tex"], *self.tex_params)
         shadow.transform = tr.matmul([tr.translate(pos[0], pos[1], 0), tr.scale(scale, scale, 0.01), tr.rotationZ(rotZ), tr.rotationX(rotX)])
         shadow.childs += [shadow_model]
         self.scenario.childs += [shadow]
@@ -168,10 +174,11 @@ class Scene:
 # Camera which controls the projection and view
 class Camera:
     def __init__(self, at=np.array([0.0, 0.0, 0.0]), eye=np.array([5.0, 5.0, 5.0]), up=np.array([-0.577, -0.577, 0.577])) -> None:
-        # View parameters
-        self.at = at
-        self.eye = eye
-        self.up = up
+        # View parameters, copies that update writes in place
+        self.at = np.array(at, dtype=np.float64)
+        self.eye = np.array(eye, dtype=np.float64)
+        self.up = np.array(up, dtype=np.float64)
+        self.orthographicUp = np.array([-0.577, -0.577, 0.577])
 
         # Cartesian coordinates
         self.x = np.square(self.eye[0])
@@ -191,17 +198,17 @@ class Camera:
     # Follow the ship
     def update(self, eye, at, up, ship):
         if(self.proj==0): # orthographic projection
-            self.up = np.array([-0.577, -0.577, 0.577])
-            self.eye = np.array([self.x+ship[0][0], self.y+ship[1][0], self.z+ship[2][0]])
-            self.at = np.array([ship[0][0], ship[1][0], ship[2][0]])
+            self.up[:] = self.orthographicUp
+            self.eye[0], self.eye[1], self.eye[2] = self.x+ship[0][0], self.y+ship[1][0], self.z+ship[2][0]
+            self.at[:] = ship[0:3, 0]
         else: # perspective projection
-            self.eye = np.array([eye[0][0], eye[1][0], eye[2][0]])
-            self.at = np.array([at[0][0], at[1][0], at[2][0]])
-            self.up = np.array([up[0][0]-eye[0][0], up[1][0]-eye[1][0], up[2][0]-eye[2][0]])
+            self.eye[:] = eye[0:3, 0]
+            self.at[:] = at[0:3, 0]
+            np.subtract(up[0:3, 0], eye[0:3, 0], out=self.up)
 
 # Movement of the ships
 class Movement:
-    def __init__(self, eye=np.array([1.0, 1.0, 1.5]), rotation_y=0.01, rotation_z=0.01) -> None:
+    def __init__(self, path, eye=np.array([1.0, 1.0, 1.5]), rotation_y=0.01, rotation_z=0.01) -> None:
         # Initial setup
         self.eye = eye
         self.speed = 0.15
@@ -214,37 +221,106 @@ class Movement:
         self.z_angle = 0 # phi
         self.curving = False # curve
         self.looping = False
-        self.change = False
-
-    # Move the ship
-    def update(self):
+        self.path = path # recorded path flown while curving
+        self.distance = 0.0 # travelled along it
+        self.heading = qt.identity() # orientation along the curve
+        self.tangent = np.zeros(3)
+        self.time = 0.0 # simulated time
+        self.previousEye = self.eye.copy()
+        self.previous = (self.previousEye, self.rotation_x, self.rotation_y, self.rotation_z) # state before the last tick
+        self.previousDistance = 0.0
+        self.previousHeading = qt.identity()
+
+        # Buffers of what is drawn, written every frame
+        self.drawnEye = self.eye.copy()
+        self.drawnHeading = qt.identity()
+        self.drawnOrientation = qt.identity()
+        self.roll = qt.identity()
+
+    # Move the ship, one fixed tick of the simulation clock
+    def update(self, dt):
         # Update facing angle of the ship
         if np.abs(self.rotation_x) > 2*np.pi:
             self.x_angle = 0
             self.rotation_x = 0
             self.looping = False
+        self.previousEye[:] = self.eye
+        self.previous = (self.previousEye, self.rotation_x, self.rotation_y, self.rotation_z)
+        self.time += dt
         self.rotation_x += self.x_angle*0.1
         self.rotation_y += self.y_angle*0.1
         self.rotation_z += self.z_angle*0.05
 
         # Move in the local x axis, hover a little bit and set the limits of the map
-        if np.abs(self.eye[0]) < 50: self.eye[0] += (self.x_direction*np.cos(self.rotation_y)+np.sin(self.rotation_y)*np.sin(2*controller.total_time)*0.01/self.speed)*np.cos(self.rotation_z)*self.speed
+        if np.abs(self.eye[0]) < 50: self.eye[0] += (self.x_direction*np.cos(self.rotation_y)+np.sin(self.rotation_y)*np.sin(2*self.time)*0.01/self.speed)*np.cos(self.rotation_z)*self.speed
         elif self.eye[0] >= 50: self.eye[0] -= 0.01
         else: self.eye[0] += 0.01
-        if np.abs(self.eye[1]) < 50: self.eye[1] += (self.x_direction*np.cos(self.rotation_y)+np.sin(self.rotation_y)*np.sin(2*controller.total_time)*0.01/self.speed)*np.sin(self.rotation_z)*self.speed
+        if np.abs(self.eye[1]) < 50: self.eye[1] += (self.x_direction*np.cos(self.rotation_y)+np.sin(self.rotation_y)*np.sin(2*self.time)*0.01/self.speed)*np.sin(self.rotation_z)*self.speed
         elif self.eye[1] >= 50: self.eye[1] -= 0.01
         else: self.eye[1] += 0.01
-        if self.eye[2] < 30 and self.eye[2] > 0.4: self.eye[2] += (self.x_direction*np.sin(self.rotation_y)*-1+np.cos(self.rotation_y)*np.sin(2*controller.total_time)*0.01/self.speed)*self.speed
+        if self.eye[2] < 30 and self.eye[2] > 0.4: self.eye[2] += (self.x_direction*np.sin(self.rotation_y)*-1+np.cos(self.rotation_y)*np.sin(2*self.time)*0.01/self.speed)*self.speed
         elif self.eye[2] >= 30: self.eye[2] -= 0.01
         else: self.eye[2] += 0.01
 
         # Stop rotation with the mouse
-        movement.y_angle = 0
+        self.y_angle = 0
+
+        # Along the recorded path at constant speed, starting again at the end
+        if self.curving:
+            self.previousDistance = self.distance
+            self.previousHeading[:] = self.heading
+            self.distance += PATH_SPEED*dt
+            length = self.path.arcLength.length
+            if length > 0 and self.distance >= length: # both move back, so they still interpolate
+                laps = np.floor(self.distance / length) * length
+                self.distance -= laps
+                self.previousDistance -= laps
+            self.follow()
+
+    # Start flying the recorded path from its beginning, or leave it
+    def togglePath(self):
+        self.curving = not self.curving
+        self.distance = self.previousDistance = 0.0
+        if self.curving:
+            self.follow()
+            self.previousHeading[:] = self.heading
+
+    # State between the last two ticks, alpha is how far the clock is towards the next one.
+    # On the path the position is the point at the distance in between.
+    def interpolated(self, alpha):
+        eye, rotation_x, rotation_y, rotation_z = self.previous
+        if self.curving:
+            length = self.path.arcLength.length
+            distance = sim.interpolate(self.previousDistance, self.distance, alpha) % length if length > 0 else 0.0
+            eye = self.path.arcLength.position(distance, out=self.drawnEye)
+        else:
+            eye = sim.interpolate(eye, self.eye, alpha, out=self.drawnEye)
+        return (eye, sim.interpolate(rotation_x, self.rotation_x, alpha),
+            sim.interpolate(rotation_y, self.rotation_y, alpha), sim.interpolate(rotation_z, self.rotation_z, alpha))
+
+    # Face along the curve with the frame of the path at the distance reached, which does not flip near vertical.
+    # The angles of the unit tangent are kept to fly on from there.
+    def follow(self):
+        tangent = self.path.arcLength.tangent(self.distance, out=self.tangent)
+        self.path.arcLength.frame(self.distance, out=self.heading)
+        self.rotation_y = -np.arcsin(min(max(tangent[2], -1.0), 1.0))
+        self.rotation_z = np.arctan2(tangent[1], tangent[0])
+
+    # Orientation of the ship, the special move rolls it around its own x axis
+    def orientation(self, alpha=1.0):
+        _, rotation_x, rotation_y, rotation_z = self.previous
+        rotation_x = sim.interpolate(rotation_x, self.rotation_x, alpha)
+        if self.curving:
+            heading = qt.slerp(self.previousHeading, self.heading, alpha, out=self.drawnHeading)
+            return qt.multiply(heading, qt.fromEuler(rotation_x, 0, 0, out=self.roll), out=self.drawnOrientation)
+        rotation_y = sim.interpolate(rotation_y, self.rotation_y, alpha)
+        rotation_z = sim.interpolate(rotation_z, self.rotation_z, alpha)
+        return qt.fromEuler(rotation_x, rotation_y, rotation_z, out=self.drawnOrientation)
 
 # Initial setup
-controller, scene, camera, movement = Controller(width=screen_width, height=screen_height), Scene(), Camera(), Movement()
-control_points = [[], []] # Coordenates, angles
-prevHermiteCurve, hermiteCurve = None, None
+path = cv.HermitePath(N) # Recorded control points and the Hermite curve through them
+controller, scene, camera, movement = Controller(width=screen_width, height=screen_height), Scene(), Camera(), Movement(path)
+simulation = sim.SimulationClock(movement.update, SIMULATION_RATE) # Ships move at a fixed rate, apart from drawing
 
 # Scenario
 scene.addScenery("build1_obj", "build1_tex", [10, 12, 0], np.pi/2, 0, 1.5)
@@ -255,6 +331,21 @@ scene.addScenery("among_us_obj", "among_us_tex", [9, -1, 1.6], np.pi/2, np.pi, 2
 scene.addScenery("among_us_obj", "among_us_tex", [9, -1, 4.4], np.pi/2, np.pi, 2) # estan muy detallados
 scene.addScenery("among_us_obj", "among_us_tex", [9, -1, 7.1], np.pi/2, np.pi, 2)
 
+scene.renderList = sg.compileRenderList(scene.root)
+scene.bvh = SceneBVH(scene.renderList, scene.scenario)
+tm.getManager().uploadPending(block=True)
+cameraBlock, lightingBlock = ub.CameraBlock(), ub.LightingBlock()
+setLightShader(lightingBlock)
+renderQueue = RenderQueue("model", ls.InstancedTexturePhongShaderProgram())
+curveRenderer = CurveRenderer(sc.getShaderCache().pygletProgram(LINE_SHADERS[0], LINE_SHADERS[1]))
+
+# Buffers the frame composes its transforms in, allocated once
+shipRot, shadowMove, shadowScale = tr.identity(), tr.identity(), tr.scale(1, 1, 0.01)
+shipPositions = np.zeros((3, 4, 1), dtype=np.float32)
+cameraPositions = np.zeros((3, 4, 1), dtype=np.float32)
+cameraView, frustum = tr.identity(), np.zeros((6, 4), dtype=np.float32)
+DOWN = np.array([0.0, 0.0, -1.0])
+
 # Camera setup
 glClearColor(0.05, 0.05, 0.1, 1.0)
 glEnable(GL_DEPTH_TEST)
@@ -264,12 +355,11 @@ glUseProgram(scene.pipeline.shaderProgram)
 @controller.event
 def on_key_press(symbol, modifiers):
     # global variables
-    global control_points, prevHermiteCurve, hermiteCurve, n
+    global n
 
     # everything else
     if symbol == pyglet.window.key._1:
-        controller.step = 0
-        if len(control_points[0]) > 0: movement.curving = not movement.curving
+        if len(path) > 1: movement.togglePath() # a curve needs two points
     if symbol == pyglet.window.key.C: camera.set_projection()
     if symbol == pyglet.window.key.V: controller.showCurve = not controller.showCurve
     if symbol == pyglet.window.key.P and not movement.looping: # special move
@@ -277,26 +367,11 @@ def on_key_press(symbol, modifiers):
         movement.x_angle = np.random.choice([1, -1])
     if not movement.curving:
         if symbol == pyglet.window.key.B: # delete path
-            control_points = [[], []]
-            prevHermiteCurve, hermiteCurve = None, None
+            path.clear()
         if symbol == pyglet.window.key.R: # curve
-            point = np.array([[movement.eye[0], movement.eye[1], movement.eye[2]]]).T
             rot_y, rot_z = movement.rotation_y, movement.rotation_z
-            angle = np.array([[np.cos(rot_y)*np.cos(rot_z), np.cos(rot_y)*np.sin(rot_z), -np.sin(rot_y)]]).T
-            control_points[0].append(point)
-            control_points[1].append(angle)
-            lenC = len(control_points[0])
-            if lenC > 2: # re create prev curve and create the end of the curve
-                vector = point-control_points[0][-3]
-                control_points[1][-2] = vector
-                GMh = hermiteMatrix(control_points[0][-3], control_points[0][-2], control_points[1][-3], control_points[1][-2])
-                if lenC > 3: prevHermiteCurve = np.concatenate((prevHermiteCurve[0:-1], evalCurve(GMh, N)), axis=0)
-                else: prevHermiteCurve = evalCurve(GMh, N)
-                GMh = hermiteMatrix(control_points[0][-2], control_points[0][-1], control_points[1][-2], control_points[1][-1])
-                hermiteCurve = np.concatenate((prevHermiteCurve[0:-1], evalCurve(GMh, N)), axis=0)
-            elif lenC == 2: # Create curve when just 2 control points
-                GMh = hermiteMatrix(control_points[0][-2], control_points[0][-1], control_points[1][-2], control_points[1][-1])
-                hermiteCurve = evalCurve(GMh, N)
+            angle = [np.cos(rot_y)*np.cos(rot_z), np.cos(rot_y)*np.sin(rot_z), -np.sin(rot_y)]
+            path.append(movement.eye, angle) # re evaluates only the last segment and the new one
         if symbol == pyglet.window.key.A: movement.z_angle += 1
         if symbol == pyglet.window.key.D: movement.z_angle -= 1
         if symbol == pyglet.window.key.W: movement.x_direction += 1
@@ -324,91 +399,62 @@ def on_mouse_motion(x, y, dx, dy):
 # What draws at every frame
 @controller.event
 def on_draw():
-    # Step update
-    if controller.step >= N*(len(control_points[0])-1)-len(control_points[0]): controller.step = -1
-    controller.step += 1
-
     # Things
     controller.clear()
     glUseProgram(scene.pipeline.shaderProgram)
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-    # Ships movement
-    movement.update()
-    if movement.curving: # curve movement
-        vector = hermiteCurve[controller.step+1]-hermiteCurve[controller.step]
-        if controller.step-1 >= 0: prev_x = hermiteCurve[controller.step][0]-hermiteCurve[controller.step-1][0]
-        else: prev_x = hermiteCurve[controller.step+1][0]-hermiteCurve[controller.step][0]
-        vector /= np.linalg.norm(vector)
-        prev_x /= np.linalg.norm(prev_x)
-        if (prev_x*vector[1] < 0) and np.abs(movement.rotation_y) > 1.50: movement.change = not movement.change
-        if movement.change:
-            if not movement.looping: movement.rotation_x = np.pi
-            movement.rotation_y = np.arcsin(-vector[2]/np.sqrt(vector[0]*vector[0]+vector[1]*vector[1]+vector[2]*vector[2]))
-        else:
-            if not movement.looping: movement.rotation_x = 0
-            movement.rotation_y = -np.arcsin(vector[2]/np.sqrt(vector[0]*vector[0]+vector[1]*vector[1]+vector[2]*vector[2]))
-        movement.rotation_z = np.sign(vector[1])*np.arccos(vector[0]/np.sqrt(vector[0]*vector[0]+vector[1]*vector[1]))
-        ship_move = [tr.translate(*hermiteCurve[controller.step])]
-    else: # free movement
-        ship_move = [tr.translate(movement.eye[0], movement.eye[1], movement.eye[2])]
-    if movement.change and controller.step == 0: # restart when beginning curve again
-        movement.rotation_x = 0
-        movement.rotation_x = np.pi
-        movement.rotation_x = 0
-        movement.change = not movement.change
-    ship_rot = [tr.rotationZ(movement.rotation_z), tr.rotationY(movement.rotation_y), tr.rotationX(movement.rotation_x)]
-    scene.shipRotation2.transform = tr.matmul([tr.translate(-2, -1, 0)])
-    scene.shipRotation3.transform = tr.matmul([tr.translate(-2, 1, 0)])
-    ship1, ship2, ship3 = sg.findPosition(scene.squad, "shipRotation"), sg.findPosition(scene.squad, "shipRotation2"), sg.findPosition(scene.squad, "shipRotation3")
-    scene.shipRotationShadow.transform = tr.matmul([tr.translate(ship1[0][0], ship1[1][0], 0.01)]+[tr.scale(1, 1, 0.01)]+ship_rot)
-    scene.shipRotationShadow2.transform = tr.matmul([tr.translate(ship2[0][0], ship2[1][0], 0.01)]+[tr.scale(1, 1, 0.01)]+ship_rot)
-    scene.shipRotationShadow3.transform = tr.matmul([tr.translate(ship3[0][0], ship3[1][0], 0.01)]+[tr.scale(1, 1, 0.01)]+ship_rot)
-    scene.squad.transform = tr.matmul(ship_move+ship_rot) # Start movement of the ships
+    # Ships movement, interpolated between the last two simulation ticks (on the path while curving)
+    position, _, _, _ = movement.interpolated(simulation.alpha)
+    orientation = movement.orientation(simulation.alpha)
+
+    # Matrices are written in place into the node buffers, marking them dirty afterwards
+    qt.toMatrix(orientation, out=shipRot)
+    ship1, ship2, ship3 = (sg.findPosition(scene.squad, name, out=buffer) for name, buffer in zip(("shipRotation", "shipRotation2", "shipRotation3"), shipPositions))
+    for shadow, ship in zip(scene.shipShadows, shipPositions):
+        # On top of the scenery right below the ship (boxes refit by the culling of the last frame)
+        below, distance = scene.bvh.raycast(ship[0:3, 0], DOWN)
+        height = ship[2][0] - distance if below is not None else 0.0
+        tr.translate(ship[0][0], ship[1][0], height + 0.01, out=shadowMove)
+        tr.matmul([shadowMove, shadowScale, shipRot], out=shadow.transform)
+        shadow.markDirty()
+    scene.squad.setTRS(position, orientation) # Start movement of the ships, built with the render list
 
     # Camera in perspective
-    scene.eye.transform = tr.matmul([tr.translate(-4.0, 0, 2.0)])
-    scene.at.transform = tr.matmul([tr.translate(0.0, 0, 2.0)])
-    scene.up.transform = tr.matmul([tr.translate(-4.0, 0, 3.0)])
-    eye, up, at = sg.findPosition(scene.squad, "eye"), sg.findPosition(scene.squad, "up"), sg.findPosition(scene.squad, "at")
+    eye, up, at = (sg.findPosition(scene.squad, name, out=buffer) for name, buffer in zip(("eye", "up", "at"), cameraPositions))
 
     # Ring and coin movement
     ring = sg.findNode(scene.root, "ring_obj")
     ringShadow = sg.findNode(scene.root, "ring_obj_shadow")
-    ring.transform = tr.matmul([tr.translate(5, -4, 5+np.sin(controller.total_time)), tr.uniformScale(2), tr.rotationZ(controller.total_time*0.2)])
-    ringShadow.transform = tr.matmul([tr.translate(5, -4, 0.1), tr.scale(2, 2, 0.01), tr.rotationZ(controller.total_time*0.2)])
     coin = sg.findNode(scene.root, "coin_obj")
     coinShadow = sg.findNode(scene.root, "coin_obj_shadow")
-    coin.transform = tr.matmul([tr.translate(-2, 10, 3+np.sin(controller.total_time)*0.5), tr.uniformScale(0.7), tr.rotationZ(controller.total_time)])
-    coinShadow.transform = tr.matmul([tr.translate(-2, 10, 0.1), tr.scale(0.7, 0.7, 0.01), tr.rotationZ(controller.total_time)])
+    # Uniform (or xy only) scales commute with rotationZ, so these are plain TRS matrices
+    t = controller.total_time
+    tr.trs((5, -4, 5+np.sin(t)), (0, 0, t*0.2), (2, 2, 2), out=ring.transform)
+    tr.trs((5, -4, 0.1), (0, 0, t*0.2), (2, 2, 0.01), out=ringShadow.transform)
+    tr.trs((-2, 10, 3+np.sin(t)*0.5), (0, 0, t), (0.7, 0.7, 0.7), out=coin.transform)
+    tr.trs((-2, 10, 0.1), (0, 0, t), (0.7, 0.7, 0.01), out=coinShadow.transform)
+    for node in (ring, ringShadow, coin, coinShadow):
+        node.markDirty()
 
     # Camera tracking of the ship, projection and view
-    setLightShader(scene.pipeline)
     camera.update(eye, at, up, ship1)
-    view = tr.lookAt(camera.eye, camera.at, camera.up)
-    glUniformMatrix4fv(glGetUniformLocation(scene.pipeline.shaderProgram, "projection"), 1, GL_TRUE, camera.projection)
-    glUniformMatrix4fv(glGetUniformLocation(scene.pipeline.shaderProgram, "view"), 1, GL_TRUE, view)
+    view = tr.lookAt(camera.eye, camera.at, camera.up, out=cameraView)
+    cameraBlock.setView(view)
+    cameraBlock.setProjection(camera.projection)
+    cameraBlock.setViewPosition(camera.eye)
+    cameraBlock.upload()
 
     # Draw curve
-    with open(Path(os.path.dirname(__file__)) / "shaders\point_vertex_program.glsl") as f: vertex_program = f.read()
-    with open(Path(os.path.dirname(__file__)) / "shaders\point_fragment_program.glsl") as f: fragment_program = f.read()
-    vert_shader = Shader(vertex_program, "vertex")
-    frag_shader = Shader(fragment_program, "fragment")
-    linePipeline = ShaderProgram(vert_shader, frag_shader)
-    if(controller.showCurve and len(control_points[0]) > 1):
-        controller.node_data = linePipeline.vertex_list(len(hermiteCurve), pyglet.gl.GL_POINTS, position="f")
-        controller.joint_data = linePipeline.vertex_list_indexed(len(hermiteCurve), pyglet.gl.GL_LINES,
-            tuple(chain(*(j for j in [range(len(hermiteCurve))]))), position="f",)
-        controller.node_data.position[:] = tuple(chain(*((p[0], p[1], p[2]) for p in hermiteCurve)))
-        controller.joint_data.position[:] = tuple(chain(*((p[0], p[1], p[2]) for p in hermiteCurve)))
-        linePipeline["projection"], linePipeline["view"] = camera.projection.reshape(16, 1, order="F"), view.reshape(16, 1, order="F")
-        linePipeline.use()
-        # controller.node_data.draw(pyglet.gl.GL_POINTS)
-        controller.joint_data.draw(pyglet.gl.GL_LINES)
+    if(controller.showCurve and len(path) > 1):
+        curveRenderer.update(path.curve, path.version, path.changedFrom)
+        curveRenderer.draw(camera.projection, view)
 
     # Light shader
     glUseProgram(scene.pipeline.shaderProgram)
-    sg.drawSceneGraphNode(scene.root, scene.pipeline, "model")
+    sg.drawRenderList(scene.renderList, scene.pipeline, "model", queue=renderQueue, planes=tr.frustumPlanes(camera.projection, view, out=frustum), bvh=scene.bvh)
+    controller.drawStats = renderQueue.flush()
+    controller.cullStats = scene.renderList.stats
 
 # Set a time in controller
 def update(dt, controller):
@@ -416,5 +462,12 @@ def update(dt, controller):
 
 # Start the scene
 if __name__ == '__main__':
-    pyglet.clock.schedule(update, controller)
-    pyglet.app.run()
\ No newline at end of file
+    if HEADLESS is not None: # a fixed number of frames with a fixed dt and scripted input
+        def step(dt):
+            update(dt, controller)
+            simulation.advance(dt)
+        hl.run(controller, HEADLESS, step)
+    else:
+        pyglet.clock.schedule(update, controller)
+        simulation.schedule()
+        pyglet.app.run(1/RENDER_RATE)
\ No newline at end of file